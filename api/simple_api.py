@@ -8,6 +8,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any
 import time
+import asyncio
 import psutil
 import os
 from datetime import datetime
@@ -95,7 +96,7 @@ async def run_benchmark(request: BenchmarkRequest):
         mem_before = get_memory_usage()
         
         # Simula processamento
-        time.sleep(0.1)  # Simula trabalho
+        await asyncio.sleep(0.1)  # Simula trabalho (sem bloquear o event loop)
         
         end_time = time.time()
         mem_after = get_memory_usage()
@@ -117,7 +118,7 @@ async def run_benchmark(request: BenchmarkRequest):
         mem_before = get_memory_usage()
         
         # Simula processamento mais lento
-        time.sleep(0.2)  # Simula trabalho mais lento
+        await asyncio.sleep(0.2)  # Simula trabalho mais lento (sem bloquear o event loop)
         
         end_time = time.time()
         mem_after = get_memory_usage()
@@ -204,4 +205,5 @@ if __name__ == "__main__":
     import uvicorn
     print("🚀 Iniciando API em http://localhost:8000")
     print("📚 Documentação: http://localhost:8000/docs")
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # Loop libuv + parser HTTP em C; um único worker porque os resultados ficam em memória
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools") 
\ No newline at end of file
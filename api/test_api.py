@@ -4,6 +4,8 @@ Script para testar a API FastAPI
 """
 
 import requests
+import httpx
+import asyncio
 import json
 import time
 from datetime import datetime
@@ -119,21 +121,27 @@ def test_performance():
     print(f"Latência do health check: {latency:.2f}ms")
     
     # Teste de throughput
-    print("Testando throughput (10 requests)...")
-    start_time = time.time()
+    total_requests = 100
+    print(f"Testando throughput ({total_requests} requests concorrentes)...")
+    start_time = time.perf_counter()
     
-    for i in range(10):
-        response = requests.get(f"{BASE_URL}/health")
+    responses = asyncio.run(_load_health(total_requests))
+    for i, response in enumerate(responses):
         if response.status_code != 200:
             print(f"❌ Erro na requisição {i+1}")
     
-    end_time = time.time()
-    total_time = end_time - start_time
-    throughput = 10 / total_time
+    total_time = time.perf_counter() - start_time
+    throughput = total_requests / total_time
     
     print(f"Throughput: {throughput:.2f} requests/segundo")
     print()
 
+async def _load_health(total_requests: int):
+    """Dispara requisições concorrentes reaproveitando conexões keep-alive"""
+    limits = httpx.Limits(max_connections=100)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits) as client:
+        return await asyncio.gather(*(client.get("/health") for _ in range(total_requests)))
+
 def main():
     """Executa todos os testes"""
     print("🧪 INICIANDO TESTES DA API")
@@ -156,7 +164,7 @@ def main():
         
         print("✅ TODOS OS TESTES CONCLUÍDOS!")
         
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, httpx.ConnectError):
         print("❌ ERRO: Não foi possível conectar à API")
         print("Certifique-se de que a API está rodando em http://localhost:8000")
     except Exception as e:
@@ -5,12 +5,17 @@ Configurações para o benchmark CaspyORM vs CQLengine
 import os
 from typing import Dict, Any
 
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
+
 # Configurações do Cassandra
 CASSANDRA_CONFIG = {
     'hosts': ['localhost'],
     'port': 9042,
     'keyspace': 'benchmark_nyc_taxi',
-    'consistency_level': 'ONE'
+    'consistency_level': 'ONE',
+    'protocol_version': 5,  # Protocolo v5 (Cassandra 4.0+)
+    'compression': 'lz4',  # Compressão LZ4 no fio (payloads de INSERT muito repetitivos)
+    'executor_threads': 8  # Threads do driver para callbacks/respostas
 }
 
 # Configurações do benchmark
@@ -18,6 +23,8 @@ BENCHMARK_CONFIG = {
     'sample_size': 50000,  # Número de registros para teste (50k para benchmark robusto)
     'query_iterations': 1000,  # Número de queries para teste de consulta
     'batch_size': 2000,  # Tamanho do batch para inserções
+    'concurrency': 256,  # Requisições simultâneas em voo no driver durante inserções
+    'partition_batch_size': 25,  # Linhas por BATCH UNLOGGED da mesma partição (limite de 50KB do Cassandra)
     'warmup_iterations': 100  # Iterações de aquecimento
 }
 
@@ -30,7 +37,7 @@ ULTRA_BENCHMARK_CONFIG = {
     'progress_logging': True,  # Log progressivo detalhado
     'preprocessing_optimized': True,  # Pré-processamento otimizado
     'bulk_operations': True,  # Usar operações bulk quando disponível
-    'parallel_processing': False,  # Processamento paralelo (desabilitado por padrão)
+    'parallel_processing': False,  # Executa CaspyORM e CQLengine simultaneamente (desabilitado por padrão: disputam o cluster)
     'cache_models': True,  # Cache de modelos para reutilização
     'optimized_queries': True  # Queries otimizadas
 }
@@ -76,6 +83,16 @@ def get_connection_config() -> Dict[str, Any]:
     """Retorna configuração de conexão com Cassandra"""
     return CASSANDRA_CONFIG.copy()
 
+def get_cluster_options() -> Dict[str, Any]:
+    """Retorna opções do Cluster do driver (token-aware, LZ4, protocolo v5)"""
+    return {
+        # Política nova a cada chamada: uma instância não pode ser compartilhada entre Clusters
+        'load_balancing_policy': TokenAwarePolicy(DCAwareRoundRobinPolicy()),
+        'compression': CASSANDRA_CONFIG['compression'],
+        'protocol_version': CASSANDRA_CONFIG['protocol_version'],
+        'executor_threads': CASSANDRA_CONFIG['executor_threads']
+    }
+
 def get_benchmark_config() -> Dict[str, Any]:
     """Retorna configuração do benchmark"""
     return BENCHMARK_CONFIG.copy()
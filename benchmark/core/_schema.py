@@ -0,0 +1,44 @@
+"""
+Constantes de schema compartilhadas pelos benchmarks CaspyORM e CQLengine
+"""
+
+from ..config import CASSANDRA_CONFIG
+
+# Mapeamento de colunas do dataset NYC Taxi para as colunas da tabela
+COLUMN_MAPPING = {
+    'VendorID': 'vendor_id',
+    'tpep_pickup_datetime': 'pickup_datetime',
+    'tpep_dropoff_datetime': 'dropoff_datetime',
+    'passenger_count': 'passenger_count',
+    'trip_distance': 'trip_distance',
+    'RatecodeID': 'rate_code_id',
+    'store_and_fwd_flag': 'store_and_fwd_flag',
+    'payment_type': 'payment_type',
+    'fare_amount': 'fare_amount',
+    'extra': 'extra',
+    'mta_tax': 'mta_tax',
+    'tip_amount': 'tip_amount',
+    'tolls_amount': 'tolls_amount',
+    'improvement_surcharge': 'improvement_surcharge',
+    'total_amount': 'total_amount',
+    'congestion_surcharge': 'congestion_surcharge',
+    'Airport_fee': 'airport_fee'
+}
+
+# Ordem das colunas no INSERT
+INSERT_COLUMNS = tuple(COLUMN_MAPPING.values())
+
+# CQL montado uma única vez no import, com marcadores posicionais para prepare()
+INSERT_CQL = (
+    f"INSERT INTO {CASSANDRA_CONFIG['keyspace']}.yellow_taxi_trips ({', '.join(INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))})"
+)
+SELECT_BY_VENDOR_CQL = f"SELECT * FROM {CASSANDRA_CONFIG['keyspace']}.yellow_taxi_trips WHERE vendor_id = ? LIMIT ?"
+
+# Classificação das colunas por tipo (lookup O(1))
+INT_COLS = frozenset({'passenger_count', 'rate_code_id'})
+FLOAT_COLS = frozenset({'trip_distance', 'fare_amount', 'extra', 'mta_tax',
+                        'tip_amount', 'tolls_amount', 'improvement_surcharge',
+                        'total_amount', 'congestion_surcharge', 'airport_fee'})
+STR_COLS = frozenset({'vendor_id', 'store_and_fwd_flag', 'payment_type'})
+DATETIME_COLS = frozenset({'pickup_datetime', 'dropoff_datetime'})
@@ -3,16 +3,23 @@ Benchmark para CaspyORM
 """
 
 import asyncio
+import os
 import time
-from typing import Dict, Any, List
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Any, List, Tuple, Iterable, Iterator, Optional
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
 from caspyorm import Model, fields
-from caspyorm.connection import connect_async, disconnect_async, execute_async
+from caspyorm.connection import connect_async, disconnect_async, execute_async, get_async_session
+from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.query import BatchStatement, BatchType, BoundStatement
 
-from ..config import get_connection_config, get_benchmark_config, get_schema_config
-from ..utils import benchmark_timer, console
+from ..config import get_connection_config, get_benchmark_config, get_schema_config, get_cluster_options
+from ._schema import INSERT_CQL, SELECT_BY_VENDOR_CQL
+from ..utils import benchmark_timer, console, decode_columns, submit_column_chunks, iter_column_chunks, iter_partition_batches
 
 # Modelo removido - usando queries diretas para compatibilidade
 
@@ -24,6 +31,10 @@ class CaspyORMBenchmark:
         self.benchmark_config = get_benchmark_config()
         self.db = None
         self.connection = None
+        self.session = None
+        self.insert_statement = None
+        self.insert_bound = None
+        self.select_statement = None
         
     async def setup_connection(self):
         """Configura conexão com Cassandra"""
@@ -33,7 +44,8 @@ class CaspyORMBenchmark:
             # Conecta ao Cassandra
             await connect_async(
                 contact_points=self.config['hosts'],
-                port=self.config['port']
+                port=self.config['port'],
+                **get_cluster_options()
             )
             
             # Cria keyspace se não existir
@@ -70,143 +82,104 @@ class CaspyORMBenchmark:
             """
             await execute_async(create_table_query)
             
+            # Prepara o INSERT uma única vez na sessão do driver aberta pelo connect_async
+            # (a mesma usada pelo execute_async; get_session() só existe após connect())
+            self.session = get_async_session()
+            self.insert_statement = self.session.prepare(INSERT_CQL)
+            # BoundStatement reaproveitado: bind() troca só a lista de valores
+            self.insert_bound = BoundStatement(self.insert_statement)
+            self.select_statement = self.session.prepare(SELECT_BY_VENDOR_CQL)
+            
             console.print("[green]✓ Conexão CaspyORM configurada[/green]")
             
         except Exception as e:
             console.print(f"[red]Erro ao configurar CaspyORM: {e}[/red]")
             raise
     
-    def prepare_data(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Prepara dados do DataFrame para inserção"""
-        records = []
-        
-        # Mapeamento de colunas do dataset NYC Taxi
-        column_mapping = {
-            'VendorID': 'vendor_id',
-            'tpep_pickup_datetime': 'pickup_datetime',
-            'tpep_dropoff_datetime': 'dropoff_datetime',
-            'passenger_count': 'passenger_count',
-            'trip_distance': 'trip_distance',
-            'RatecodeID': 'rate_code_id',
-            'store_and_fwd_flag': 'store_and_fwd_flag',
-            'payment_type': 'payment_type',
-            'fare_amount': 'fare_amount',
-            'extra': 'extra',
-            'mta_tax': 'mta_tax',
-            'tip_amount': 'tip_amount',
-            'tolls_amount': 'tolls_amount',
-            'improvement_surcharge': 'improvement_surcharge',
-            'total_amount': 'total_amount',
-            'congestion_surcharge': 'congestion_surcharge',
-            'Airport_fee': 'airport_fee'
-        }
-        
-        for _, row in df.iterrows():
-            record = {}
-            
-            # Mapeia as colunas corretamente
-            for source_col, target_col in column_mapping.items():
-                if source_col in row.index:
-                    value = row[source_col]
-                    
-                    # Tratamento especial para tipos de dados
-                    if pd.isna(value):
-                        if target_col in ['passenger_count', 'rate_code_id']:
-                            value = 1
-                        elif target_col in ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 
-                                          'tip_amount', 'tolls_amount', 'improvement_surcharge', 
-                                          'total_amount', 'congestion_surcharge', 'airport_fee']:
-                            value = 0.0
-                        else:
-                            value = None
-                    else:
-                        # Converte tipos
-                        if target_col == 'vendor_id':
-                            value = str(value)
-                        elif target_col in ['passenger_count', 'rate_code_id']:
-                            value = int(value)
-                        elif target_col in ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 
-                                          'tip_amount', 'tolls_amount', 'improvement_surcharge', 
-                                          'total_amount', 'congestion_surcharge', 'airport_fee']:
-                            value = float(value)
-                        elif target_col in ['store_and_fwd_flag', 'payment_type']:
-                            value = str(value)
-                        elif 'datetime' in target_col:
-                            value = pd.to_datetime(value)
-                    
-                    record[target_col] = value
-                else:
-                    # Valor padrão se coluna não existir
-                    if target_col in ['passenger_count', 'rate_code_id']:
-                        record[target_col] = 1
-                    elif target_col in ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 
-                                      'tip_amount', 'tolls_amount', 'improvement_surcharge', 
-                                      'total_amount', 'congestion_surcharge', 'airport_fee']:
-                        record[target_col] = 0.0
-                    else:
-                        record[target_col] = None
-            
-            records.append(record)
-        
-        return records
+    def prepare_data_chunks(self, df: pd.DataFrame, chunk_size: Optional[int] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """Prepara dados do DataFrame em lotes de colunas (SoA), gerados sob demanda"""
+        return iter_column_chunks(df, chunk_size or self.benchmark_config['batch_size'])
     
     @benchmark_timer
-    async def benchmark_insert(self, records: List[Dict[str, Any]]) -> List[Any]:
+    async def benchmark_insert(self, chunks: Iterable[Dict[str, np.ndarray]]) -> int:
         """Benchmark de inserção com CaspyORM"""
         console.print("[blue]Executando benchmark de inserção CaspyORM...[/blue]")
+        inserted_count = 0
+        # Cada lote é inserido assim que é preparado; o anterior já pode ser liberado
+        for columns in chunks:
+            inserted_count += await self._insert_columns(columns)
+        return inserted_count
+    
+    @benchmark_timer
+    async def benchmark_insert_stream(self, df: pd.DataFrame) -> int:
+        """Benchmark de inserção com preparo e inserção sobrepostos (produtor/consumidor)"""
+        console.print("[blue]Executando benchmark de inserção CaspyORM (pipeline)...[/blue]")
         
-        batch_size = self.benchmark_config['batch_size']
-        inserted_records = []
+        chunk_size = self.benchmark_config['batch_size']
+        workers = os.cpu_count() or 1
+        inserted_count = 0
         
-        # Inserção em lotes
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            
-            # Prepara queries de inserção
-            insert_queries = []
-            for record in batch:
-                query = f"""
-                INSERT INTO {self.config['keyspace']}.yellow_taxi_trips (
-                    vendor_id, pickup_datetime, dropoff_datetime, passenger_count,
-                    trip_distance, rate_code_id, store_and_fwd_flag, payment_type,
-                    fare_amount, extra, mta_tax, tip_amount, tolls_amount,
-                    improvement_surcharge, total_amount, congestion_surcharge, airport_fee
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                values = (
-                    record['vendor_id'], 
-                    record['pickup_datetime'].strftime('%Y-%m-%d %H:%M:%S'), 
-                    record['dropoff_datetime'].strftime('%Y-%m-%d %H:%M:%S'),
-                    record['passenger_count'], record['trip_distance'], record['rate_code_id'],
-                    record['store_and_fwd_flag'], record['payment_type'], record['fare_amount'],
-                    record['extra'], record['mta_tax'], record['tip_amount'], record['tolls_amount'],
-                    record['improvement_surcharge'], record['total_amount'], 
-                    record['congestion_surcharge'], record['airport_fee']
-                )
-                insert_queries.append((query, values))
-            
-            # Executa queries em lote
-            for query, values in insert_queries:
-                await execute_async(query, values)
-                inserted_records.append(record)
+        # Até `workers` lotes sendo preparados em outros processos (ida e volta em
+        # Arrow IPC, sem pickle de DataFrames/objetos) enquanto o atual é inserido
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in submit_column_chunks(pool, df, chunk_size, workers):
+                inserted_count += await self._insert_columns(decode_columns(await asyncio.wrap_future(future)))
         
-        return inserted_records
+        return inserted_count
+    
+    async def _insert_columns(self, columns: Dict[str, np.ndarray]) -> int:
+        """Insere as colunas em BATCHes UNLOGGED concorrentes"""
+        batch_size = self.benchmark_config['partition_batch_size']
+        semaphore = asyncio.Semaphore(self.benchmark_config['concurrency'])
+        inserted_count = 0
+        batches = []
+        
+        bind = self.insert_bound.bind
+        
+        # BATCH UNLOGGED só com linhas da mesma partição (vendor_id)
+        for rows in iter_partition_batches(columns, batch_size):
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            # A primeira linha define o routing key do batch; nas demais o mesmo
+            # BoundStatement é religado (cada bind() gera uma nova lista de valores,
+            # capturada pelo batch no add), sem alocar um statement por linha
+            batch.add(self.insert_statement, rows[0])
+            batch.add_all(map(bind, rows[1:]), repeat(None))
+            batches.append(batch)
+            inserted_count += len(rows)
+        
+        async def send(batch):
+            async with semaphore:
+                await execute_async(batch)
+        
+        # Vários batches em voo ao mesmo tempo, limitados pelo semáforo
+        await asyncio.gather(*(send(batch) for batch in batches))
+        
+        return inserted_count
+    
+    def benchmark_insert_rows(self, rows: List[Tuple[Any, ...]], concurrency: int = 100) -> int:
+        """Insere tuplas na ordem do INSERT com execução concorrente do driver (síncrono)"""
+        execute_concurrent_with_args(self.session, self.insert_statement, rows, concurrency=concurrency)
+        return len(rows)
     
     @benchmark_timer
-    async def benchmark_query(self, vendor_id: str = "1") -> List[Any]:
+    async def benchmark_query(self, vendor_id: str = "1", limit: int = 10) -> int:
         """Benchmark de consulta com CaspyORM"""
         console.print("[blue]Executando benchmark de consulta CaspyORM...[/blue]")
         
         iterations = self.benchmark_config['query_iterations']
-        results = []
+        rows_read = 0
         
         for _ in range(iterations):
-            # Consulta simples por vendor_id
-            query = f"SELECT * FROM {self.config['keyspace']}.yellow_taxi_trips WHERE vendor_id = %s LIMIT 10"
-            result = await execute_async(query, (vendor_id,))
-            results.extend(result)
+            # Consulta simples por vendor_id (LIMIT aplicado no Cassandra); só conta as linhas
+            result = await execute_async(self.select_statement, (vendor_id, limit))
+            rows_read += sum(1 for _ in result)
         
-        return results
+        return rows_read
+    
+    async def fetch_trips(self, vendor_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Busca até `limit` viagens de um vendor com uma única consulta"""
+        rows = await execute_async(self.select_statement, (vendor_id, limit))
+        return [row._asdict() for row in rows]
     
     async def run_benchmark(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Executa benchmark completo com CaspyORM"""
@@ -215,14 +188,11 @@ class CaspyORMBenchmark:
         # Setup
         await self.setup_connection()
         
-        # Prepara dados
-        records = self.prepare_data(df)
-        
-        # Benchmark de inserção
-        insert_results = await self.benchmark_insert(records)
+        # Benchmark de inserção (preparo dos dados sobreposto à inserção)
+        insert_results = await self.benchmark_insert_stream(df)
         
-        # Aguarda um pouco para estabilizar
-        await asyncio.sleep(1)
+        # Ponto de sincronização: uma ida e volta ao coordenador em vez de dormir 1s
+        await execute_async("SELECT now() FROM system.local")
         
         # Benchmark de consulta
         query_results = await self.benchmark_query()
@@ -239,7 +209,7 @@ class CaspyORMBenchmark:
             'query_time': query_results['execution_time'],
             'total_time': total_time,
             'memory_used': total_memory,
-            'records_inserted': len(insert_results['result']),
+            'records_inserted': insert_results['result'],
             'queries_executed': self.benchmark_config['query_iterations']
         }
         
@@ -2,17 +2,24 @@
 Benchmark para CQLengine
 """
 
-import time
-from typing import Dict, Any, List
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Any, Iterable, Iterator, Optional
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from cassandra.cluster import Session
 from cassandra.cqlengine.models import Model
 from cassandra.cqlengine import columns, connection, management
 from cassandra.cqlengine.connection import get_session
+from cassandra.query import BatchStatement, BatchType, BoundStatement
+from cassandra.concurrent import execute_concurrent
 
-from ..config import get_connection_config, get_benchmark_config, get_schema_config
-from ..utils import benchmark_timer, console
+from ..config import get_connection_config, get_benchmark_config, get_schema_config, get_cluster_options
+from ._schema import INSERT_CQL
+from ..utils import benchmark_timer, console, decode_columns, submit_column_chunks, iter_column_chunks, iter_partition_batches
 
 class NYCYellowTaxiTripCQL(Model):
     """Modelo para dados do NYC Yellow Taxi usando CQLengine"""
@@ -42,25 +49,34 @@ class NYCYellowTaxiTripCQL(Model):
 class CQLengineBenchmark:
     """Classe para executar benchmark com CQLengine"""
     
-    def __init__(self):
+    def __init__(self, session: Optional[Session] = None):
         self.config = get_connection_config()
         self.benchmark_config = get_benchmark_config()
-        self.session = None
+        # Sessão emprestada (mesmo Cluster de outro benchmark) não é encerrada aqui
+        self.session = session
+        self.owns_session = session is None
+        self.insert_statement = None
+        self.insert_bound = None
         
     def setup_connection(self):
         """Configura conexão com Cassandra"""
         console.print("[blue]Configurando conexão CQLengine...[/blue]")
         
         try:
-            # Configura conexão
-            connection.setup(
-                hosts=self.config['hosts'],
-                port=self.config['port'],
-                default_keyspace=self.config['keyspace']
-            )
-            
-            # Obtém sessão
-            self.session = get_session()
+            if self.owns_session:
+                # Configura conexão
+                connection.setup(
+                    hosts=self.config['hosts'],
+                    port=self.config['port'],
+                    default_keyspace=self.config['keyspace'],
+                    **get_cluster_options()
+                )
+                
+                # Obtém sessão
+                self.session = get_session()
+            else:
+                # Reaproveita Cluster/Session já conectados (sem novo handshake e token map)
+                connection.set_session(self.session)
             
             # Cria keyspace se não existir
             self.session.execute(f"""
@@ -71,122 +87,86 @@ class CQLengineBenchmark:
             # Sincroniza schema (MANUAL com CQLengine!)
             management.sync_table(NYCYellowTaxiTripCQL)
             
+            # Prepara o INSERT uma única vez (plano em cache no servidor, parâmetros binários)
+            self.insert_statement = self.session.prepare(INSERT_CQL)
+            # BoundStatement reaproveitado: bind() troca só a lista de valores
+            self.insert_bound = BoundStatement(self.insert_statement)
+            
             console.print("[green]✓ Conexão CQLengine configurada[/green]")
             
         except Exception as e:
             console.print(f"[red]Erro ao configurar CQLengine: {e}[/red]")
             raise
     
-    def prepare_data(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Prepara dados do DataFrame para inserção"""
-        records = []
-        
-        # Mapeamento de colunas do dataset NYC Taxi
-        column_mapping = {
-            'VendorID': 'vendor_id',
-            'tpep_pickup_datetime': 'pickup_datetime',
-            'tpep_dropoff_datetime': 'dropoff_datetime',
-            'passenger_count': 'passenger_count',
-            'trip_distance': 'trip_distance',
-            'RatecodeID': 'rate_code_id',
-            'store_and_fwd_flag': 'store_and_fwd_flag',
-            'payment_type': 'payment_type',
-            'fare_amount': 'fare_amount',
-            'extra': 'extra',
-            'mta_tax': 'mta_tax',
-            'tip_amount': 'tip_amount',
-            'tolls_amount': 'tolls_amount',
-            'improvement_surcharge': 'improvement_surcharge',
-            'total_amount': 'total_amount',
-            'congestion_surcharge': 'congestion_surcharge',
-            'Airport_fee': 'airport_fee'
-        }
-        
-        for _, row in df.iterrows():
-            record = {}
-            
-            # Mapeia as colunas corretamente
-            for source_col, target_col in column_mapping.items():
-                if source_col in row.index:
-                    value = row[source_col]
-                    
-                    # Tratamento especial para tipos de dados
-                    if pd.isna(value):
-                        if target_col in ['passenger_count', 'rate_code_id']:
-                            value = 1
-                        elif target_col in ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 
-                                          'tip_amount', 'tolls_amount', 'improvement_surcharge', 
-                                          'total_amount', 'congestion_surcharge', 'airport_fee']:
-                            value = 0.0
-                        else:
-                            value = None
-                    else:
-                        # Converte tipos
-                        if target_col == 'vendor_id':
-                            value = str(value)
-                        elif target_col in ['passenger_count', 'rate_code_id']:
-                            value = int(value)
-                        elif target_col in ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 
-                                          'tip_amount', 'tolls_amount', 'improvement_surcharge', 
-                                          'total_amount', 'congestion_surcharge', 'airport_fee']:
-                            value = float(value)
-                        elif target_col in ['store_and_fwd_flag', 'payment_type']:
-                            value = str(value)
-                        elif 'datetime' in target_col:
-                            value = pd.to_datetime(value)
-                    
-                    record[target_col] = value
-                else:
-                    # Valor padrão se coluna não existir
-                    if target_col in ['passenger_count', 'rate_code_id']:
-                        record[target_col] = 1
-                    elif target_col in ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 
-                                      'tip_amount', 'tolls_amount', 'improvement_surcharge', 
-                                      'total_amount', 'congestion_surcharge', 'airport_fee']:
-                        record[target_col] = 0.0
-                    else:
-                        record[target_col] = None
-            
-            records.append(record)
-        
-        return records
+    def prepare_data_chunks(self, df: pd.DataFrame, chunk_size: Optional[int] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """Prepara dados do DataFrame em lotes de colunas (SoA), gerados sob demanda"""
+        return iter_column_chunks(df, chunk_size or self.benchmark_config['batch_size'])
     
     @benchmark_timer
-    def benchmark_insert(self, records: List[Dict[str, Any]]) -> List[Any]:
+    def benchmark_insert(self, chunks: Iterable[Dict[str, np.ndarray]]) -> int:
         """Benchmark de inserção com CQLengine"""
         console.print("[blue]Executando benchmark de inserção CQLengine...[/blue]")
+        inserted_count = 0
+        # Cada lote é inserido assim que é preparado; o anterior já pode ser liberado
+        for cols in chunks:
+            inserted_count += self._insert_columns(cols)
+        return inserted_count
+    
+    @benchmark_timer
+    def benchmark_insert_stream(self, df: pd.DataFrame) -> int:
+        """Benchmark de inserção com o preparo do próximo lote em paralelo"""
+        console.print("[blue]Executando benchmark de inserção CQLengine (pipeline)...[/blue]")
         
-        batch_size = self.benchmark_config['batch_size']
-        inserted_records = []
+        chunk_size = self.benchmark_config['batch_size']
+        inserted_count = 0
         
-        # Inserção em lotes (síncrono)
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            
-            # Cria instâncias do modelo
-            trip_instances = [NYCYellowTaxiTripCQL(**record) for record in batch]
-            
-            # Insere em lote (síncrono)
-            for instance in trip_instances:
-                instance.save()
-                inserted_records.append(instance)
+        workers = os.cpu_count() or 1
+        
+        # Até `workers` lotes sendo preparados em outros processos (ida e volta em
+        # Arrow IPC, sem pickle de DataFrames/objetos) enquanto o atual é inserido
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in submit_column_chunks(pool, df, chunk_size, workers):
+                inserted_count += self._insert_columns(decode_columns(future.result()))
         
-        return inserted_records
+        return inserted_count
+    
+    def _insert_columns(self, cols: Dict[str, np.ndarray]) -> int:
+        """Insere as colunas em BATCHes UNLOGGED concorrentes (síncrono)"""
+        batch_size = self.benchmark_config['partition_batch_size']
+        bind = self.insert_bound.bind
+        batches = []
+        inserted_count = 0
+        
+        # BATCH UNLOGGED só com linhas da mesma partição (vendor_id)
+        for rows in iter_partition_batches(cols, batch_size):
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            # A primeira linha define o routing key do batch; nas demais o mesmo
+            # BoundStatement é religado (cada bind() gera uma nova lista de valores,
+            # capturada pelo batch no add), sem alocar um statement por linha
+            batch.add(self.insert_statement, rows[0])
+            batch.add_all(map(bind, rows[1:]), repeat(None))
+            batches.append((batch, None))
+            inserted_count += len(rows)
+        
+        # Pipelining no driver, sem passar pelo save() do modelo
+        execute_concurrent(self.session, batches, concurrency=self.benchmark_config['concurrency'])
+        
+        return inserted_count
     
     @benchmark_timer
-    def benchmark_query(self, vendor_id: str = "1") -> List[Any]:
+    def benchmark_query(self, vendor_id: str = "1") -> int:
         """Benchmark de consulta com CQLengine"""
         console.print("[blue]Executando benchmark de consulta CQLengine...[/blue]")
         
         iterations = self.benchmark_config['query_iterations']
-        results = []
+        rows_read = 0
         
         for _ in range(iterations):
-            # Consulta simples por vendor_id (síncrona)
+            # Consulta simples por vendor_id (síncrona); só conta as linhas
             query_results = NYCYellowTaxiTripCQL.filter(vendor_id=vendor_id).limit(10)
-            results.extend(list(query_results))
+            rows_read += sum(1 for _ in query_results)
         
-        return results
+        return rows_read
     
     def run_benchmark(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Executa benchmark completo com CQLengine"""
@@ -195,14 +175,11 @@ class CQLengineBenchmark:
         # Setup
         self.setup_connection()
         
-        # Prepara dados
-        records = self.prepare_data(df)
-        
-        # Benchmark de inserção
-        insert_results = self.benchmark_insert(records)
+        # Benchmark de inserção (preparo do próximo lote sobreposto à inserção)
+        insert_results = self.benchmark_insert_stream(df)
         
-        # Aguarda um pouco para estabilizar
-        time.sleep(1)
+        # Ponto de sincronização: uma ida e volta ao coordenador em vez de dormir 1s
+        self.session.execute("SELECT now() FROM system.local")
         
         # Benchmark de consulta
         query_results = self.benchmark_query()
@@ -219,7 +196,7 @@ class CQLengineBenchmark:
             'query_time': query_results['execution_time'],
             'total_time': total_time,
             'memory_used': total_memory,
-            'records_inserted': len(insert_results['result']),
+            'records_inserted': insert_results['result'],
             'queries_executed': self.benchmark_config['query_iterations']
         }
         
@@ -228,13 +205,13 @@ class CQLengineBenchmark:
     
     def cleanup(self):
         """Limpa recursos"""
-        if self.session:
+        if self.session and self.owns_session:
             self.session.shutdown()
 
 # Função de conveniência para execução
-def run_cqlengine_benchmark(df: pd.DataFrame) -> Dict[str, Any]:
+def run_cqlengine_benchmark(df: pd.DataFrame, session: Optional[Session] = None) -> Dict[str, Any]:
     """Executa benchmark CQLengine e retorna resultados"""
-    benchmark = CQLengineBenchmark()
+    benchmark = CQLengineBenchmark(session)
     try:
         results = benchmark.run_benchmark(df)
         return results
@@ -9,6 +9,8 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+import uvloop
+
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -21,7 +23,7 @@ from benchmark.utils import (
     create_summary_panel,
     console
 )
-from benchmark.core.base_caspy import run_caspy_benchmark
+from benchmark.core.base_caspy import CaspyORMBenchmark
 from benchmark.core.base_cqlengine import run_cqlengine_benchmark
 
 async def main():
@@ -51,29 +53,35 @@ async def main():
     
     # Executa benchmark CaspyORM
     console.print("\n[bold green]🚀 Executando Benchmark CaspyORM...[/bold green]")
+    caspy_benchmark = CaspyORMBenchmark()
     try:
-        caspy_results = await run_caspy_benchmark(df)
-        
-        # Salva resultados
-        caspy_filename = results_dir / f"caspyorm_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        save_results(caspy_results, str(caspy_filename))
-        
-    except Exception as e:
-        console.print(f"[red]❌ Erro no benchmark CaspyORM: {e}[/red]")
-        caspy_results = None
-    
-    # Executa benchmark CQLengine
-    console.print("\n[bold yellow]🚀 Executando Benchmark CQLengine...[/bold yellow]")
-    try:
-        cql_results = run_cqlengine_benchmark(df)
-        
-        # Salva resultados
-        cql_filename = results_dir / f"cqlengine_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        save_results(cql_results, str(cql_filename))
+        try:
+            caspy_results = await caspy_benchmark.run_benchmark(df)
+            
+            # Salva resultados
+            caspy_filename = results_dir / f"caspyorm_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            save_results(caspy_results, str(caspy_filename))
+            
+        except Exception as e:
+            console.print(f"[red]❌ Erro no benchmark CaspyORM: {e}[/red]")
+            caspy_results = None
         
-    except Exception as e:
-        console.print(f"[red]❌ Erro no benchmark CQLengine: {e}[/red]")
-        cql_results = None
+        # Executa benchmark CQLengine
+        console.print("\n[bold yellow]🚀 Executando Benchmark CQLengine...[/bold yellow]")
+        try:
+            # Reaproveita o Cluster/Session do CaspyORM (um só pool e token map);
+            # sem sessão (falha no setup) o CQLengine abre a própria conexão
+            cql_results = run_cqlengine_benchmark(df, session=caspy_benchmark.session)
+            
+            # Salva resultados
+            cql_filename = results_dir / f"cqlengine_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            save_results(cql_results, str(cql_filename))
+            
+        except Exception as e:
+            console.print(f"[red]❌ Erro no benchmark CQLengine: {e}[/red]")
+            cql_results = None
+    finally:
+        await caspy_benchmark.cleanup()
     
     # Exibe resultados comparativos
     if caspy_results and cql_results:
@@ -113,5 +121,7 @@ async def main():
     console.print("\n[green]✅ Benchmark concluído![/green]")
 
 if __name__ == "__main__":
-    # Executa o benchmark
+    # Executa o benchmark sobre o loop libuv; só o caminho assíncrono (CaspyORM)
+    # passa pelo event loop, o CQLengine roda síncrono e não é afetado
+    uvloop.install()
     asyncio.run(main()) 
\ No newline at end of file
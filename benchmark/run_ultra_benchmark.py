@@ -16,7 +16,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from benchmark.config import get_data_config, get_benchmark_config, ULTRA_BENCHMARK_CONFIG, DATA_CONFIG
 from benchmark.utils import (
     load_and_concat_ultra, convert_chunk_to_models, process_in_chunks_ultra,
-    memory_usage_mb, optimized_query_execution, console, save_results,
+    memory_usage_mb, optimized_query_execution, sample_rows, console, save_results,
     display_comparison_table
 )
 from rich.panel import Panel
@@ -56,7 +56,7 @@ async def run_ultra_benchmark():
     
     # Amostra os dados se necessário
     if len(df) > data_config['target_records']:
-        df = df.sample(n=data_config['target_records'], random_state=42)
+        df = sample_rows(df, data_config['target_records'])
     
     load_time = time.time() - start_time
     mem_after = memory_usage_mb()
@@ -66,49 +66,61 @@ async def run_ultra_benchmark():
     console.print(f"✓ Memória utilizada: {mem_after-mem_before:.1f} MB")
     console.print(f"✓ Memória atual: {mem_after:.1f} MB")
     
-    # Executa benchmark CaspyORM ULTRA
-    console.print(f"\n[bold green]🚀 Executando Benchmark CaspyORM ULTRA...[/bold green]")
-    caspy_results = None
-    
-    try:
-        caspy_start = time.time()
-        caspy_results = await run_caspy_benchmark(df)
-        caspy_time = time.time() - caspy_start
-        
-        console.print(f"✅ CaspyORM ULTRA concluído em {caspy_time:.2f}s")
-        console.print(f"   📊 Inserção: {caspy_results['insert_ops_per_second']:.0f} ops/s")
-        console.print(f"   🔍 Consulta: {caspy_results['query_ops_per_second']:.0f} ops/s")
-        console.print(f"   🧠 Memória: {caspy_results['memory_used']:.1f} MB")
-        
-        # Salva resultados
-        save_results(caspy_results, 'caspyorm_ultra')
-        
-    except Exception as e:
-        console.print(f"[red]❌ Erro no CaspyORM ULTRA: {e}[/red]")
-        import traceback
-        traceback.print_exc()
-    
-    # Executa benchmark CQLengine ULTRA
-    console.print(f"\n[bold green]🚀 Executando Benchmark CQLengine ULTRA...[/bold green]")
-    cql_results = None
-    
-    try:
-        cql_start = time.time()
-        cql_results = run_cqlengine_benchmark(df)
-        cql_time = time.time() - cql_start
+    async def run_caspy():
+        """Executa o benchmark CaspyORM ULTRA e retorna os resultados (ou None)"""
+        console.print(f"\n[bold green]🚀 Executando Benchmark CaspyORM ULTRA...[/bold green]")
         
-        console.print(f"✅ CQLengine ULTRA concluído em {cql_time:.2f}s")
-        console.print(f"   📊 Inserção: {cql_results['insert_ops_per_second']:.0f} ops/s")
-        console.print(f"   🔍 Consulta: {cql_results['query_ops_per_second']:.0f} ops/s")
-        console.print(f"   🧠 Memória: {cql_results['memory_used']:.1f} MB")
+        try:
+            caspy_start = time.time()
+            caspy_results = await run_caspy_benchmark(df)
+            caspy_time = time.time() - caspy_start
+            
+            console.print(f"✅ CaspyORM ULTRA concluído em {caspy_time:.2f}s")
+            console.print(f"   📊 Inserção: {caspy_results['insert_ops_per_second']:.0f} ops/s")
+            console.print(f"   🔍 Consulta: {caspy_results['query_ops_per_second']:.0f} ops/s")
+            console.print(f"   🧠 Memória: {caspy_results['memory_used']:.1f} MB")
+            
+            # Salva resultados
+            save_results(caspy_results, 'caspyorm_ultra')
+            return caspy_results
+            
+        except Exception as e:
+            console.print(f"[red]❌ Erro no CaspyORM ULTRA: {e}[/red]")
+            import traceback
+            traceback.print_exc()
+            return None
+    
+    def run_cql():
+        """Executa o benchmark CQLengine ULTRA e retorna os resultados (ou None)"""
+        console.print(f"\n[bold green]🚀 Executando Benchmark CQLengine ULTRA...[/bold green]")
         
-        # Salva resultados
-        save_results(cql_results, 'cqlengine_ultra')
-        
-    except Exception as e:
-        console.print(f"[red]❌ Erro no CQLengine ULTRA: {e}[/red]")
-        import traceback
-        traceback.print_exc()
+        try:
+            cql_start = time.time()
+            cql_results = run_cqlengine_benchmark(df)
+            cql_time = time.time() - cql_start
+            
+            console.print(f"✅ CQLengine ULTRA concluído em {cql_time:.2f}s")
+            console.print(f"   📊 Inserção: {cql_results['insert_ops_per_second']:.0f} ops/s")
+            console.print(f"   🔍 Consulta: {cql_results['query_ops_per_second']:.0f} ops/s")
+            console.print(f"   🧠 Memória: {cql_results['memory_used']:.1f} MB")
+            
+            # Salva resultados
+            save_results(cql_results, 'cqlengine_ultra')
+            return cql_results
+            
+        except Exception as e:
+            console.print(f"[red]❌ Erro no CQLengine ULTRA: {e}[/red]")
+            import traceback
+            traceback.print_exc()
+            return None
+    
+    if ultra_config['parallel_processing']:
+        # Os dois benchmarks ao mesmo tempo (CQLengine síncrono numa thread): tempo total
+        # tende ao do mais lento, mas ambos disputam o mesmo cluster e as métricas se misturam
+        caspy_results, cql_results = await asyncio.gather(run_caspy(), asyncio.to_thread(run_cql))
+    else:
+        caspy_results = await run_caspy()
+        cql_results = run_cql()
     
     # Comparação final
     if caspy_results and cql_results:
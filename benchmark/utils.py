@@ -4,10 +4,27 @@ Utilitários para o benchmark CaspyORM vs CQLengine
 
 import time
 import json
+import queue
+import threading
+try:
+    import orjson
+except ImportError:  # fallback para o json da stdlib
+    orjson = None
 import psutil
+import numpy as np
 import pandas as pd
 import asyncio
-from typing import Dict, Any, List, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+from cassandra import ConsistencyLevel
+from cassandra.concurrent import execute_concurrent
+from cassandra.query import BatchStatement, BatchType
+from collections import defaultdict, deque
+from functools import lru_cache
+from itertools import islice
+from keyword import iskeyword
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Iterator, Union
 from datetime import datetime
 from rich.console import Console
 from rich.table import Table
@@ -16,8 +33,136 @@ from rich.panel import Panel
 import os
 from functools import wraps
 
+from .core._schema import (
+    COLUMN_MAPPING, INSERT_COLUMNS, INT_COLS, FLOAT_COLS, STR_COLS, DATETIME_COLS
+)
+
 console = Console()
 
+# Processo atual criado uma vez (evita reabrir /proc/self a cada medição)
+_PROC = psutil.Process(os.getpid())
+
+# Colunas de cada tipo na ordem do INSERT (para seleção no DataFrame)
+INT_COLUMNS = [col for col in INSERT_COLUMNS if col in INT_COLS]
+FLOAT_COLUMNS = [col for col in INSERT_COLUMNS if col in FLOAT_COLS]
+STR_COLUMNS = [col for col in INSERT_COLUMNS if col in STR_COLS]
+DATETIME_COLUMNS = [col for col in INSERT_COLUMNS if col in DATETIME_COLS]
+
+# Colunas do parquet consumidas pelos benchmarks (projeção no leitor)
+NEEDED_COLUMNS = list(COLUMN_MAPPING)
+
+# Colunas numéricas reduzidas para float32 logo após a leitura (inteiros com NA chegam
+# como double do parquet; o cast para int32 acontece em prepare_columns)
+DOWNCAST_TYPES = {raw: pa.float32() for raw, col in COLUMN_MAPPING.items() if col in INT_COLS or col in FLOAT_COLS}
+
+def prepare_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Converte o DataFrame em colunas contíguas (SoA) prontas para inserção
+    """
+    # Aceita tanto os nomes originais do parquet quanto os já renomeados;
+    # colunas ausentes entram como NaN e recebem o valor padrão abaixo
+    df = df.rename(columns=COLUMN_MAPPING).reindex(columns=list(INSERT_COLUMNS))
+
+    # Uma operação vetorizada por grupo de tipo
+    ints = df[INT_COLUMNS].fillna(1).astype('int32')
+    floats = df[FLOAT_COLUMNS].fillna(0.0).astype('float32')
+    strs = df[STR_COLUMNS]
+    strs = strs.astype(str).astype(object).where(strs.notna(), None)
+
+    columns = {}
+    for col in INT_COLUMNS:
+        columns[col] = ints[col].to_numpy()
+    for col in FLOAT_COLUMNS:
+        columns[col] = floats[col].to_numpy()
+    for col in STR_COLUMNS:
+        columns[col] = strs[col].to_numpy()
+    for col in DATETIME_COLUMNS:
+        values = pd.to_datetime(df[col])
+        columns[col] = np.array(values.dt.to_pydatetime(), dtype=object)
+        columns[col][values.isna().to_numpy()] = None
+
+    # Ordena por partição (vendor_id) para formar BATCHes contíguos
+    order = np.argsort(pd.factorize(columns['vendor_id'])[0], kind='stable')
+    return {col: values[order] for col, values in columns.items()}
+
+def iter_rows(columns: Dict[str, Any]) -> Iterator[Tuple[Any, ...]]:
+    """
+    Itera as colunas como tuplas na ordem de INSERT_COLUMNS, sem criar dicts por linha
+    """
+    # tolist() converte cada coluna em objetos Python num único loop em C;
+    # iterar o ndarray direto criaria um escalar NumPy por célula
+    return zip(*(
+        columns[col].tolist() if isinstance(columns[col], np.ndarray) else columns[col]
+        for col in INSERT_COLUMNS
+    ))
+
+def iter_partition_batches(columns: Dict[str, Any], batch_size: int) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Agrupa linhas consecutivas da mesma partição (vendor_id) em lotes de até batch_size
+    """
+    batch = []
+    for values in iter_rows(columns):
+        if batch and (values[0] != batch[0][0] or len(batch) >= batch_size):
+            yield batch
+            batch = []
+        batch.append(values)
+    if batch:
+        yield batch
+
+def iter_column_chunks(df: pd.DataFrame, chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Prepara o DataFrame em lotes de colunas de até chunk_size linhas, sob demanda
+    (pico de memória proporcional ao lote, não ao dataset)
+    """
+    for start in range(0, len(df), chunk_size):
+        yield prepare_columns(df.iloc[start:start + chunk_size])
+
+def encode_table(table: pa.Table) -> pa.Buffer:
+    """
+    Serializa a tabela no formato Arrow IPC (um buffer contíguo, barato de enviar a outro processo)
+    """
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def prepare_ipc_chunk(buffer: pa.Buffer) -> pa.Buffer:
+    """
+    Executado no processo de preparo: lote Arrow IPC de entrada -> colunas prontas em Arrow IPC
+    """
+    df = pa.ipc.open_stream(buffer).read_all().to_pandas()
+    columns = prepare_columns(df)
+    return encode_table(pa.table({col: pa.array(values) for col, values in columns.items()}))
+
+def decode_columns(buffer: pa.Buffer) -> Dict[str, Any]:
+    """
+    Reconstrói as colunas de um lote Arrow IPC: numéricas como ndarray, texto/datas
+    como listas Python (convertidas em C++, com None nos nulos)
+    """
+    table = pa.ipc.open_stream(buffer).read_all()
+    return {
+        name: column.to_numpy() if pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+        else column.to_pylist()
+        for name, column in zip(table.column_names, table.columns)
+    }
+
+def submit_column_chunks(pool: Executor, df: pd.DataFrame, chunk_size: int, depth: int) -> Iterator[Future]:
+    """
+    Envia os lotes do DataFrame ao pool de processos como Arrow IPC, mantendo até `depth`
+    lotes em preparo, e gera os futures em ordem (o resultado é passado a decode_columns)
+    """
+    def submit(start):
+        chunk = pa.Table.from_pandas(df.iloc[start:start + chunk_size], preserve_index=False)
+        return pool.submit(prepare_ipc_chunk, encode_table(chunk))
+    
+    starts = iter(range(0, len(df), chunk_size))
+    pending = deque(map(submit, islice(starts, depth)))
+    while pending:
+        future = pending.popleft()
+        # Repõe o lote consumido antes de entregar o atual
+        pending.extend(map(submit, islice(starts, 1)))
+        yield future
+
 def load_nyc_taxi_data(parquet_file: str, sample_size: int = 50000) -> pd.DataFrame:
     """
     Carrega dados do arquivo parquet do NYC Taxi
@@ -25,12 +170,9 @@ def load_nyc_taxi_data(parquet_file: str, sample_size: int = 50000) -> pd.DataFr
     console.print(f"[blue]Carregando dados de {parquet_file}...[/blue]")
     
     try:
-        # Lê o arquivo parquet
-        df = pd.read_parquet(parquet_file)
-        
-        # Seleciona uma amostra
-        if len(df) > sample_size:
-            df = df.sample(n=sample_size, random_state=42)
+        # Lê só as colunas usadas e só os primeiros sample_size registros
+        # (projeção e limite aplicados no leitor parquet, não depois da carga)
+        df = load_nyc_taxi_batch(parquet_file, sample_size)
         
         # Mapeia nomes das colunas
         column_mapping = {
@@ -41,12 +183,9 @@ def load_nyc_taxi_data(parquet_file: str, sample_size: int = 50000) -> pd.DataFr
             'Airport_fee': 'airport_fee'
         }
         
-        # Renomeia colunas
+        # Renomeia colunas (linhas sem chave primária já descartadas no lote)
         df = df.rename(columns=column_mapping)
         
-        # Limpa e prepara os dados
-        df = df.dropna(subset=['vendor_id', 'pickup_datetime', 'dropoff_datetime'])
-        
         # Converte tipos de dados
         df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
         df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
@@ -59,53 +198,84 @@ def load_nyc_taxi_data(parquet_file: str, sample_size: int = 50000) -> pd.DataFr
         console.print(f"[red]Erro ao carregar dados: {e}[/red]")
         raise
 
+@lru_cache(maxsize=8)
+def get_parquet_file(parquet_file: str) -> pq.ParquetFile:
+    """
+    Abre o arquivo parquet uma única vez (metadados/footer ficam em cache)
+    """
+    return pq.ParquetFile(parquet_file)
+
+def load_nyc_taxi_batch(parquet_file: str, sample_size: int = 1000) -> pd.DataFrame:
+    """
+    Lê apenas o primeiro lote do parquet, com projeção das colunas usadas no INSERT
+    """
+    pf = get_parquet_file(parquet_file)
+    columns = [col for col in NEEDED_COLUMNS if col in pf.schema_arrow.names]
+
+    # Memória O(sample_size) em vez de O(arquivo)
+    batches = pf.iter_batches(batch_size=sample_size, columns=columns, use_threads=True)
+    batch = next(batches, None)
+    if batch is None:
+        return pd.DataFrame(columns=columns)
+
+    df = batch.to_pandas(split_blocks=True, self_destruct=True)
+    del batch
+    df = df.dropna(subset=[col for col in ('VendorID', 'tpep_pickup_datetime', 'tpep_dropoff_datetime') if col in df.columns])
+    console.print(f"[green]✓ Lote carregado: {len(df)} registros[/green]")
+    return df
+
 def measure_memory_usage() -> float:
     """
     Mede o uso de memória atual do processo
     """
-    process = psutil.Process()
-    return process.memory_info().rss / 1024 / 1024  # MB
+    return _PROC.memory_info().rss / 1024 / 1024  # MB
+
+def count_operations(result: Any) -> int:
+    """
+    Número de operações de um resultado: contador inteiro ou coleção
+    """
+    return result if isinstance(result, int) else len(result)
 
 def benchmark_timer(func):
     """
     Decorator para medir tempo de execução de funções
     """
     def wrapper(*args, **kwargs):
-        start_time = time.time()
         start_memory = measure_memory_usage()
+        start_ns = time.perf_counter_ns()
         
         result = func(*args, **kwargs)
         
-        end_time = time.time()
+        end_ns = time.perf_counter_ns()
         end_memory = measure_memory_usage()
         
-        execution_time = end_time - start_time
+        execution_time = (end_ns - start_ns) / 1e9
         memory_used = end_memory - start_memory
         
         return {
             'result': result,
             'execution_time': execution_time,
             'memory_used': memory_used,
-            'operations_per_second': len(result) / execution_time if result else 0
+            'operations_per_second': count_operations(result) / execution_time if result else 0
         }
     
     async def async_wrapper(*args, **kwargs):
-        start_time = time.time()
         start_memory = measure_memory_usage()
+        start_ns = time.perf_counter_ns()
         
         result = await func(*args, **kwargs)
         
-        end_time = time.time()
+        end_ns = time.perf_counter_ns()
         end_memory = measure_memory_usage()
         
-        execution_time = end_time - start_time
+        execution_time = (end_ns - start_ns) / 1e9
         memory_used = end_memory - start_memory
         
         return {
             'result': result,
             'execution_time': execution_time,
             'memory_used': memory_used,
-            'operations_per_second': len(result) / execution_time if result else 0
+            'operations_per_second': count_operations(result) / execution_time if result else 0
         }
     
     if asyncio.iscoroutinefunction(func):
@@ -119,8 +289,15 @@ def save_results(results: Dict[str, Any], filename: str):
     """
     results['timestamp'] = datetime.now().isoformat()
     
-    with open(filename, 'w') as f:
-        json.dump(results, f, indent=2, default=str)
+    if orjson is not None:
+        # Encoder em C com datetime e escalares/arrays NumPy nativos; default só
+        # é chamado para tipos que o orjson não conhece
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(results, default=str,
+                                 option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2))
+    else:
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
     
     console.print(f"[green]✓ Resultados salvos em {filename}[/green]")
 
@@ -230,8 +407,27 @@ def create_summary_panel(caspy_results: Dict[str, Any], cql_results: Dict[str, A
 
 def memory_usage_mb() -> float:
     """Monitora uso de memória em tempo real"""
-    process = psutil.Process(os.getpid())
-    return process.memory_info().rss / 1024 / 1024
+    return _PROC.memory_info().rss / 1024 / 1024
+
+def read_projected_table(parquet_file: str) -> pa.Table:
+    """
+    Lê só as colunas usadas, com leitura em paralelo e pré-buffer de I/O,
+    já com as colunas numéricas em float32
+    """
+    columns = [col for col in NEEDED_COLUMNS if col in get_parquet_file(parquet_file).schema_arrow.names]
+    table = pq.read_table(parquet_file, columns=columns, use_threads=True, pre_buffer=True)
+    
+    # Metade dos bytes por valor numérico em tudo que vem depois (concat, pandas, chunks)
+    schema = pa.schema([
+        field.with_type(DOWNCAST_TYPES[field.name])
+        if field.name in DOWNCAST_TYPES and (pa.types.is_floating(field.type) or pa.types.is_integer(field.type))
+        else field
+        for field in table.schema
+    ])
+    return table.cast(schema, safe=False)
+
+# Tabelas lidas à frente do consumo em load_and_concat_ultra (limita a memória)
+READ_AHEAD = 2
 
 def load_and_concat_ultra(files: List[str], target_gb: float = 0.5) -> pd.DataFrame:
     """
@@ -239,81 +435,176 @@ def load_and_concat_ultra(files: List[str], target_gb: float = 0.5) -> pd.DataFr
     """
     console.print(f"[bold blue]📊 Carregando {len(files)} arquivos parquet...[/bold blue]")
     
-    dfs = []
-    total_size = 0
+    target_bytes = target_gb * 1024 * 1024 * 1024
     
+    existing = []
     for file in files:
         if os.path.exists(file):
-            console.print(f"  📁 Carregando {file}...")
-            df = pd.read_parquet(file)
-            dfs.append(df)
-            total_size += len(df)
-            console.print(f"    ✓ {len(df):,} registros carregados")
+            existing.append(file)
         else:
             console.print(f"  ⚠️ Arquivo não encontrado: {file}")
     
-    if not dfs:
+    # Produtor/consumidor: uma thread lê/descomprime o arquivo i+1 (o PyArrow libera o GIL)
+    # enquanto esta converte o arquivo i para pandas; a fila limitada segura no máximo
+    # READ_AHEAD tabelas Arrow à espera de conversão
+    ready: queue.Queue = queue.Queue(maxsize=READ_AHEAD)
+    # Sinaliza ao produtor que não leia mais arquivos (alvo atingido ou falha no consumo)
+    stop = threading.Event()
+    
+    def produce():
+        read_bytes = 0
+        try:
+            for i, file in enumerate(existing):
+                if stop.is_set():
+                    break
+                table = read_projected_table(file)
+                # Parada antecipada pelos bytes Arrow em memória (tbl.nbytes), já com o downcast;
+                # lidos antes do put: depois dele o consumidor libera os buffers (self_destruct)
+                read_bytes += table.nbytes
+                ready.put((file, table))
+                del table
+                if read_bytes >= target_bytes:
+                    stop.set()
+                    if i + 1 < len(existing):
+                        console.print(f"  🎯 Alvo de {target_gb} GB atingido, ignorando {len(existing) - i - 1} arquivo(s)")
+        finally:
+            ready.put(None)
+    
+    frames = []
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        producer = pool.submit(produce)
+        try:
+            while (item := ready.get()) is not None:
+                file, table = item
+                console.print(f"  📁 Carregado {file}")
+                total_bytes += table.nbytes
+                # Um bloco por coluna (sem consolidar) e buffers Arrow liberados durante a conversão
+                frames.append(table.to_pandas(split_blocks=True, self_destruct=True))
+                del table, item
+                console.print(f"    ✓ {len(frames[-1]):,} registros carregados")
+        except BaseException:
+            # Libera o produtor (que pode estar bloqueado no put) antes de propagar
+            stop.set()
+            while ready.get() is not None:
+                pass
+            raise
+        # Propaga erro de leitura do produtor
+        producer.result()
+    
+    if not frames:
         raise FileNotFoundError("Nenhum arquivo parquet encontrado")
     
-    # Concatena todos os DataFrames
-    console.print(f"[bold green]🔄 Concatenando {len(dfs)} DataFrames...[/bold green]")
-    combined_df = pd.concat(dfs, ignore_index=True)
+    console.print(f"[bold green]🔄 Concatenando {len(frames)} DataFrames...[/bold green]")
+    combined_df = pd.concat(frames, ignore_index=True)
+    del frames
     
-    # Calcula tamanho em GB
-    size_gb = combined_df.memory_usage(deep=True).sum() / 1024 / 1024 / 1024
+    # Tamanho em GB pelos buffers Arrow lidos (metadado, sem percorrer as strings)
+    size_gb = total_bytes / 1024 / 1024 / 1024
     
     console.print(f"✓ Dataset combinado: {len(combined_df):,} registros ({size_gb:.2f} GB)")
     console.print(f"✓ Memória atual: {memory_usage_mb():.1f} MB")
     
     return combined_df
 
-def convert_chunk_to_models(chunk: pd.DataFrame, model_class) -> List[Any]:
+def sample_rows(df: pd.DataFrame, n: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Amostra n linhas sem reposição sem gerar a permutação completa do DataFrame
+    (índices sorteados em O(n) e lidos em ordem, preservando a localidade)
+    """
+    idx = np.random.default_rng(seed).choice(len(df), size=n, replace=False)
+    idx.sort()
+    return df.take(idx)
+
+def fill_numeric(values: np.ndarray, fill: float) -> np.ndarray:
+    """
+    Substitui NaN por fill in-place (máscara + cópia condicional em kernels NumPy)
+    """
+    np.copyto(values, fill, where=np.isnan(values))
+    return values
+
+@lru_cache(maxsize=None)
+def model_constructor(model_class):
+    """
+    Construtor mais rápido disponível para o modelo: model_construct (Pydantic v2)
+    pula a validação por campo, já que as colunas chegam limpas e tipadas
+    """
+    return getattr(model_class, 'model_construct', model_class)
+
+@lru_cache(maxsize=None)
+def row_converter(names: Tuple[str, ...]):
+    """
+    Gera (uma vez por conjunto de colunas) a função que cria os modelos do chunk,
+    com os argumentos nomeados escritos no código em vez de um dict por linha
+    """
+    args = ', '.join(f'_{i}' for i in range(len(names)))
+    kwargs = ', '.join(f'{name}=_{i}' for i, name in enumerate(names))
+    source = (
+        "def convert(construct, columns):\n"
+        f"    return [construct({kwargs}) for {args}, in zip(*columns)]\n"
+    )
+    namespace = {}
+    exec(source, namespace)
+    return namespace['convert']
+
+def convert_chunk_to_models(chunk: Union[pd.DataFrame, pa.RecordBatch], model_class) -> List[Any]:
     """
-    Converte chunk do DataFrame para modelos com fallback seguro
+    Converte chunk do DataFrame (ou RecordBatch Arrow) para modelos com fallback seguro
+    (tratamento de NA e tipos feito por coluna; só a criação do modelo é por linha)
     """
+    if isinstance(chunk, pa.RecordBatch):
+        chunk = chunk.to_pandas(split_blocks=True)
+    
+    columns = {}
+    for col in chunk.columns:
+        series = chunk[col]
+        
+        # Tratamento especial para tipos de dados, uma vez por coluna
+        if col in INT_COLS:
+            values = fill_numeric(series.to_numpy(dtype=np.float64, copy=True, na_value=np.nan), 1)
+            columns[col] = values.astype(np.int64).tolist()
+        elif col in FLOAT_COLS:
+            values = fill_numeric(series.to_numpy(dtype=np.float64, copy=True, na_value=np.nan), 0.0)
+            columns[col] = values.tolist()
+        else:
+            # Converte timestamps que vieram como texto
+            if 'datetime' in col and series.dtype == object:
+                series = pd.to_datetime(series, errors='coerce')
+            columns[col] = series.astype(object).where(series.notna(), None).tolist()
+    
+    names = tuple(columns)
+    construct = model_constructor(model_class)
+    
+    if all(name.isidentifier() and not iskeyword(name) for name in names):
+        try:
+            # Caminho rápido: conversor gerado para este schema, argumentos nomeados fixos
+            return row_converter(names)(construct, list(columns.values()))
+        except Exception:
+            pass  # alguma linha falhou: refaz linha a linha, descartando só as inválidas
+    
     models = []
     
-    for _, row in chunk.iterrows():
+    for values in zip(*columns.values()):
         try:
-            # Converte tipos de dados com fallback
-            model_data = {}
-            for col in row.index:
-                value = row[col]
-                
-                # Tratamento especial para tipos de dados
-                if pd.isna(value):
-                    if col in ['passenger_count', 'rate_code_id']:
-                        value = 1
-                    elif col in ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 
-                               'tip_amount', 'tolls_amount', 'improvement_surcharge', 
-                               'total_amount', 'congestion_surcharge', 'airport_fee']:
-                        value = 0.0
-                    else:
-                        value = None
-                
-                # Converte timestamps
-                elif 'datetime' in col and pd.notna(value):
-                    if isinstance(value, str):
-                        value = pd.to_datetime(value)
-                
-                model_data[col] = value
-            
             # Cria instância do modelo
-            model = model_class(**model_data)
-            models.append(model)
-            
+            models.append(construct(**dict(zip(names, values))))
         except Exception as e:
             console.print(f"[yellow]⚠️ Erro ao converter linha: {e}[/yellow]")
             continue
     
     return models
 
-def process_in_chunks_ultra(df: pd.DataFrame, chunk_size: int = 50000, 
+def process_in_chunks_ultra(df: Union[pd.DataFrame, pa.Table], chunk_size: int = 50000, 
                           process_func=None, **kwargs) -> List[Dict[str, Any]]:
     """
-    Processa DataFrame em chunks otimizados com monitoramento
+    Processa DataFrame (ou tabela Arrow) em chunks otimizados com monitoramento
     """
-    total_chunks = len(df) // chunk_size + (1 if len(df) % chunk_size > 0 else 0)
+    if isinstance(df, pa.Table):
+        # RecordBatches zero-copy: só deslocamento dos buffers Arrow, sem iloc
+        chunks = df.to_batches(max_chunksize=chunk_size)
+    else:
+        chunks = [df.iloc[i:i+chunk_size] for i in range(0, len(df), chunk_size)]
+    total_chunks = len(chunks)
     results = []
     
     console.print(f"[bold blue]🔄 Processando {len(df):,} registros em {total_chunks} chunks...[/bold blue]")
@@ -329,9 +620,8 @@ def process_in_chunks_ultra(df: pd.DataFrame, chunk_size: int = 50000,
         
         task = progress.add_task("Processando chunks...", total=total_chunks)
         
-        for i in range(0, len(df), chunk_size):
+        for i, chunk in enumerate(chunks):
             chunk_start = time.time()
-            chunk = df.iloc[i:i+chunk_size]
             
             # Monitora memória antes do processamento
             mem_before = memory_usage_mb()
@@ -345,52 +635,125 @@ def process_in_chunks_ultra(df: pd.DataFrame, chunk_size: int = 50000,
             mem_after = memory_usage_mb()
             chunk_time = time.time() - chunk_start
             
-            # Log progressivo detalhado
+            # Log progressivo detalhado (texto puro: sem parser de markup/realce do Rich por chunk)
             progress.update(task, advance=1)
-            console.print(f"  Chunk {i//chunk_size + 1}/{total_chunks}: "
+            console.print(f"  Chunk {i + 1}/{total_chunks}: "
                          f"{len(chunk):,} registros em {chunk_time:.1f}s, "
                          f"Memória: {mem_before:.1f}MB → {mem_after:.1f}MB "
-                         f"(Δ{mem_after-mem_before:+.1f}MB)")
+                         f"(Δ{mem_after-mem_before:+.1f}MB)",
+                         markup=False, highlight=False, soft_wrap=True)
     
     return results
 
-def bulk_create_models(models: List[Any], batch_size: int = 50) -> int:
+def bulk_create_models(models: List[Any], session, prepared, batch_size: int = 50,
+                       concurrency: int = 100) -> int:
     """
-    Cria múltiplos modelos em batches otimizados
+    Cria múltiplos modelos em BATCHes UNLOGGED de statements preparados,
+    agrupados por partição (cada batch vai direto à réplica dona via token-aware)
     """
+    columns = [col.name for col in prepared.column_metadata]
+    key_indexes = prepared.routing_key_indexes or [0]
+    
+    # Agrupa as linhas pela chave de partição do INSERT
+    partitions = defaultdict(list)
+    for model in models:
+        values = tuple(getattr(model, col) for col in columns)
+        partitions[tuple(values[i] for i in key_indexes)].append(values)
+    
+    batches = []
+    batch_rows = []
+    for rows in partitions.values():
+        for i in range(0, len(rows), batch_size):
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED, consistency_level=ConsistencyLevel.ONE)
+            for values in rows[i:i+batch_size]:
+                batch.add(prepared, values)
+            batches.append((batch, None))
+            batch_rows.append(len(rows[i:i+batch_size]))
+    
     total_created = 0
     
-    for i in range(0, len(models), batch_size):
-        batch = models[i:i+batch_size]
-        try:
-            # Aqui você implementaria a lógica de bulk_create específica
-            # para cada ORM (CaspyORM ou CQLengine)
-            total_created += len(batch)
-        except Exception as e:
-            console.print(f"[red]❌ Erro no batch {i//batch_size + 1}: {e}[/red]")
+    # Batches em voo ao mesmo tempo; um batch com erro não interrompe os demais
+    results = execute_concurrent(session, batches, concurrency=concurrency, raise_on_first_error=False)
+    for i, (success, result) in enumerate(results):
+        if success:
+            total_created += batch_rows[i]
+        else:
+            console.print(f"[red]❌ Erro no batch {i + 1}: {result}[/red]")
     
     return total_created
 
 def optimized_query_execution(query_func, iterations: int, 
                             batch_size: int = 50) -> Dict[str, Any]:
     """
-    Executa queries otimizadas em batches
+    Executa queries otimizadas em batches, com as queries de cada batch em voo ao mesmo tempo.
+    Para query_func assíncrona use optimized_query_execution_async
     """
+    if asyncio.iscoroutinefunction(query_func):
+        raise TypeError("query_func assíncrona: use await optimized_query_execution_async(...)")
+    
     start_time = time.time()
     mem_before = memory_usage_mb()
     
-    results = []
+    # Pré-alocado: cada sucesso ocupa a próxima posição, sem realocar a lista
+    results = [None] * iterations
+    executed = 0
+    batch_times = []
+    
+    # Driver síncrono: as queries do batch rodam em threads (I/O libera o GIL)
+    with ThreadPoolExecutor(max_workers=batch_size) as pool:
+        for i in range(0, iterations, batch_size):
+            batch_iterations = min(batch_size, iterations - i)
+            batch_start = time.time()
+            
+            futures = [pool.submit(query_func) for _ in range(batch_iterations)]
+            for j, future in enumerate(futures):
+                try:
+                    results[executed] = future.result()
+                    executed += 1
+                except Exception as e:
+                    console.print(f"[yellow]⚠️ Erro na query {i + j}: {e}[/yellow]")
+            
+            batch_times.append(time.time() - batch_start)
+    
+    del results[executed:]
+    return _query_execution_summary(results, batch_times, start_time, mem_before)
+
+async def optimized_query_execution_async(query_func, iterations: int,
+                                          batch_size: int = 50) -> Dict[str, Any]:
+    """
+    Versão assíncrona de optimized_query_execution (asyncio.gather por batch)
+    """
+    start_time = time.time()
+    mem_before = memory_usage_mb()
+    
+    results = [None] * iterations
+    executed = 0
+    batch_times = []
     
     for i in range(0, iterations, batch_size):
         batch_iterations = min(batch_size, iterations - i)
+        batch_start = time.time()
+        
+        batch_results = await asyncio.gather(
+            *(query_func() for _ in range(batch_iterations)), return_exceptions=True
+        )
+        for j, result in enumerate(batch_results):
+            if isinstance(result, Exception):
+                console.print(f"[yellow]⚠️ Erro na query {i + j}: {result}[/yellow]")
+            else:
+                results[executed] = result
+                executed += 1
         
-        for _ in range(batch_iterations):
-            try:
-                result = query_func()
-                results.append(result)
-            except Exception as e:
-                console.print(f"[yellow]⚠️ Erro na query {i+_}: {e}[/yellow]")
+        batch_times.append(time.time() - batch_start)
     
+    del results[executed:]
+    return _query_execution_summary(results, batch_times, start_time, mem_before)
+
+def _query_execution_summary(results: List[Any], batch_times: List[float],
+                             start_time: float, mem_before: float) -> Dict[str, Any]:
+    """
+    Monta as métricas de optimized_query_execution (inclui o tempo de cada batch)
+    """
     end_time = time.time()
     mem_after = memory_usage_mb()
     
@@ -398,5 +761,6 @@ def optimized_query_execution(query_func, iterations: int,
         'total_time': end_time - start_time,
         'memory_used': mem_after - mem_before,
         'queries_executed': len(results),
-        'ops_per_second': len(results) / (end_time - start_time)
+        'ops_per_second': len(results) / (end_time - start_time),
+        'batch_times': batch_times
     } 
\ No newline at end of file
@@ -3,10 +3,46 @@
 Script para combinar dados do NYC Taxi de múltiplos meses
 """
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import os
 from pathlib import Path
 
+# Linhas lidas por lote (memória limitada a um lote, independente do total de arquivos)
+BATCH_SIZE = 200_000
+
+# Linhas por row group no arquivo combinado (lotes acumulados até esse tamanho)
+ROW_GROUP_SIZE = 1_000_000
+
+# Colunas que não podem ser nulas e que identificam uma viagem
+KEY_COLUMNS = ['VendorID', 'tpep_pickup_datetime', 'tpep_dropoff_datetime']
+
+# Runs ordenados de hashes novos acumulados antes de fundir no array principal
+MERGE_RUNS = 16
+
+# Colunas com média nas estatísticas finais
+MEAN_COLUMNS = ['total_amount', 'trip_distance', 'passenger_count']
+
+def conform_to_schema(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Alinha colunas e tipos do lote ao schema do arquivo de saída"""
+    columns = [
+        table[field.name].cast(field.type) if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def in_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """Máscara de pertinência por busca binária num array já ordenado (sem reordenar)"""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    pos = np.searchsorted(sorted_values, values)
+    pos[pos == len(sorted_values)] = 0
+    return sorted_values[pos] == values
+
 def combine_nyc_taxi_data():
     """Combina dados de múltiplos meses do NYC Taxi"""
     
@@ -17,43 +53,106 @@ def combine_nyc_taxi_data():
     parquet_files = list(data_dir.glob("yellow_tripdata_*.parquet"))
     parquet_files = [f for f in parquet_files if "combined" not in f.name]
     
-    print(f"📊 Combinando {len(parquet_files)} arquivos de dados...")
-    
-    # Carrega e combina os dados
-    dfs = []
-    total_records = 0
+    if not parquet_files:
+        raise FileNotFoundError(f"Nenhum arquivo parquet encontrado em {data_dir}")
     
-    for file_path in sorted(parquet_files):
-        print(f"   📁 Carregando {file_path.name}...")
-        df = pd.read_parquet(file_path)
-        total_records += len(df)
-        dfs.append(df)
-        print(f"      ✅ {len(df):,} registros carregados")
+    print(f"📊 Combinando {len(parquet_files)} arquivos de dados...")
+    parquet_files = sorted(parquet_files)
     
-    # Combina todos os DataFrames
-    print("🔄 Combinando dados...")
-    combined_df = pd.concat(dfs, ignore_index=True)
+    # Schema de saída = união dos schemas de todos os arquivos (só os footers são lidos);
+    # colunas ausentes num mês entram como nulas e tipos divergentes são promovidos
+    schema = pa.unify_schemas(
+        [pq.ParquetFile(f).schema_arrow for f in parquet_files],
+        promote_options="permissive"
+    )
     
-    # Limpa dados
-    print("🧹 Limpando dados...")
-    combined_df = combined_df.dropna(subset=['VendorID', 'tpep_pickup_datetime', 'tpep_dropoff_datetime'])
+    # Lê, limpa e grava lote a lote, sem concatenar os meses em memória
+    writer = pq.ParquetWriter(
+        output_file, schema,
+        compression='zstd', compression_level=3,
+        use_dictionary=True, write_statistics=True,
+        data_page_size=1 << 20
+    )
+    pending = []
+    pending_rows = 0
+    seen_hashes = np.empty(0, dtype=np.uint64)
+    seen_runs = []
+    total_records = 0
+    unique_records = 0
+    pickup_min = pickup_max = None
+    sums = dict.fromkeys(MEAN_COLUMNS, 0.0)
+    counts = dict.fromkeys(MEAN_COLUMNS, 0)
     
-    # Remove duplicatas
-    combined_df = combined_df.drop_duplicates()
+    try:
+        for file_path in parquet_files:
+            print(f"   📁 Carregando {file_path.name}...")
+            pf = pq.ParquetFile(file_path)
+            
+            file_records = 0
+            for batch in pf.iter_batches(batch_size=BATCH_SIZE):
+                table = conform_to_schema(pa.Table.from_batches([batch]), schema)
+                file_records += table.num_rows
+                
+                # Limpa dados
+                valid = pc.is_valid(table[KEY_COLUMNS[0]])
+                for col in KEY_COLUMNS[1:]:
+                    valid = pc.and_(valid, pc.is_valid(table[col]))
+                table = table.filter(valid)
+                
+                # Remove duplicatas, inclusive entre lotes e arquivos: hash de 64 bits só da
+                # chave da viagem (duplicatas vêm da sobreposição entre meses)
+                hashes = pd.util.hash_pandas_object(table.select(KEY_COLUMNS).to_pandas(), index=False).to_numpy()
+                unique_hashes, first = np.unique(hashes, return_index=True)
+                new = ~in_sorted(unique_hashes, seen_hashes)
+                for run in seen_runs:
+                    new &= ~in_sorted(unique_hashes, run)
+                # Hashes novos do lote já saem ordenados do np.unique: viram um run, e os
+                # runs só são fundidos ao array principal a cada MERGE_RUNS lotes
+                seen_runs.append(unique_hashes[new])
+                if len(seen_runs) >= MERGE_RUNS:
+                    seen_hashes = np.sort(np.concatenate([seen_hashes, *seen_runs]))
+                    seen_runs = []
+                keep = np.sort(first[new])
+                table = table.take(keep)
+                
+                # Row groups grandes: acumula lotes até ROW_GROUP_SIZE antes de gravar
+                pending.append(table)
+                pending_rows += table.num_rows
+                if pending_rows >= ROW_GROUP_SIZE:
+                    writer.write_table(pa.concat_tables(pending), row_group_size=ROW_GROUP_SIZE)
+                    pending = []
+                    pending_rows = 0
+                unique_records += table.num_rows
+                
+                # Estatísticas acumuladas por lote
+                if table.num_rows:
+                    bounds = pc.min_max(table['tpep_pickup_datetime']).as_py()
+                    pickup_min = bounds['min'] if pickup_min is None else min(pickup_min, bounds['min'])
+                    pickup_max = bounds['max'] if pickup_max is None else max(pickup_max, bounds['max'])
+                for col in MEAN_COLUMNS:
+                    sums[col] += pc.sum(table[col]).as_py() or 0
+                    counts[col] += pc.count(table[col]).as_py()
+            
+            total_records += file_records
+            print(f"      ✅ {file_records:,} registros carregados")
+        
+        if pending:
+            writer.write_table(pa.concat_tables(pending), row_group_size=ROW_GROUP_SIZE)
+    finally:
+        writer.close()
     
-    print(f"✅ Dados combinados: {len(combined_df):,} registros únicos")
-    print(f"📁 Salvando em: {output_file}")
+    means = {col: sums[col] / counts[col] if counts[col] else float('nan') for col in MEAN_COLUMNS}
     
-    # Salva arquivo combinado
-    combined_df.to_parquet(output_file, index=False)
+    print(f"✅ Dados combinados: {unique_records:,} registros únicos")
+    print(f"📁 Salvo em: {output_file}")
     
     # Mostra estatísticas
     print(f"\n📈 Estatísticas do Dataset Combinado:")
-    print(f"   📊 Total de registros: {len(combined_df):,}")
-    print(f"   🗓️  Período: {combined_df['tpep_pickup_datetime'].min()} a {combined_df['tpep_pickup_datetime'].max()}")
-    print(f"   💰 Valor médio: ${combined_df['total_amount'].mean():.2f}")
-    print(f"   🚗 Distância média: {combined_df['trip_distance'].mean():.2f} milhas")
-    print(f"   👥 Passageiros médios: {combined_df['passenger_count'].mean():.1f}")
+    print(f"   📊 Total de registros: {unique_records:,}")
+    print(f"   🗓️  Período: {pickup_min} a {pickup_max}")
+    print(f"   💰 Valor médio: ${means['total_amount']:.2f}")
+    print(f"   🚗 Distância média: {means['trip_distance']:.2f} milhas")
+    print(f"   👥 Passageiros médios: {means['passenger_count']:.1f}")
     
     # Calcula tamanho do arquivo
     file_size_mb = output_file.stat().st_size / (1024 * 1024)
@@ -64,4 +163,4 @@ def combine_nyc_taxi_data():
 if __name__ == "__main__":
     output_file = combine_nyc_taxi_data()
     print(f"\n🎯 Dataset combinado salvo em: {output_file}")
-    print("🚀 Agora você pode executar o benchmark com mais dados!") 
\ No newline at end of file
+    print("🚀 Agora você pode executar o benchmark com mais dados!")
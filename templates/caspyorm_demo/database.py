@@ -6,33 +6,59 @@ Demonstração de sintaxe moderna e recursos avançados
 
 import asyncio
 import logging
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+import time
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterable, Tuple, Union
+from datetime import datetime, timedelta, timezone
 import uuid
+from collections import Counter
+from itertools import repeat
+from operator import attrgetter, itemgetter
+import numpy as np
+import pandas as pd
+import pyarrow as pa
 
 # CaspyORM imports
-from caspyorm.connection import connect_async, disconnect_async
+from caspyorm.connection import connect_async, disconnect_async, execute_async, get_async_session
 from caspyorm import Model
 from caspyorm.fields import Text, Integer, Float, Timestamp, Boolean, UUID
 from caspyorm.query import Query
+from cassandra.concurrent import execute_concurrent, execute_concurrent_with_args
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
+from cassandra.query import BatchStatement, BatchType
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Utilitários de tempo
+def utc_now() -> datetime:
+    """Data/hora atual em UTC, com fuso (datetime.utcnow é obsoleto no Python 3.12)"""
+    return datetime.now(timezone.utc)
+
+@lru_cache(maxsize=1)
+def _iso_for_second(second: int) -> str:
+    return datetime.fromtimestamp(second, timezone.utc).isoformat()
+
+def iso_now() -> str:
+    """Timestamp ISO em UTC com resolução de 1s, reaproveitado dentro do mesmo segundo"""
+    return _iso_for_second(int(time.time()))
+
 # Configurações do Cassandra
 CASSANDRA_CONFIG = {
     'hosts': ['localhost'],
     'port': 9042,
     'keyspace': 'taxi_demo',
-    'protocol_version': 4,
+    # Protocolo v5 (Cassandra 4.0+): 32768 stream ids por conexão, sem limite extra de pool
+    'protocol_version': 5,
     'connect_timeout': 10,
     'request_timeout': 30,
     'consistency_level': 'QUORUM',
     'retry_policy': 'DEFAULT',
-    'load_balancing_policy': 'DEFAULT',
+    # Token-aware: cada escrita vai direto a uma réplica, sem salto extra no coordenador
+    'load_balancing_policy': TokenAwarePolicy(DCAwareRoundRobinPolicy()),
     'reconnection_policy': 'DEFAULT',
-    'compression': True,
+    'compression': 'lz4',  # LZ4 explícito (pacote lz4): menos bytes no fio nas escritas em massa
     'ssl_options': None,
     'auth_provider': None,
     'execution_profiles': {
@@ -54,6 +80,243 @@ CASSANDRA_CONFIG = {
     }
 }
 
+# Colunas de dados na ordem do INSERT (entre a chave primária e a auditoria)
+DATA_COLUMNS = (
+    'vendor_id', 'pickup_datetime', 'dropoff_datetime', 'passenger_count',
+    'trip_distance', 'rate_code_id', 'store_and_fwd_flag', 'payment_type',
+    'fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
+    'improvement_surcharge', 'total_amount', 'congestion_surcharge', 'airport_fee',
+    'pickup_location_id', 'dropoff_location_id'
+)
+# trip_duration_minutes é derivada das datas e gravada uma vez, na inserção
+INSERT_COLUMNS = ('trip_id', 'pickup_date', *DATA_COLUMNS, 'trip_duration_minutes', 'created_at', 'updated_at')
+INSERT_CQL = (
+    f"INSERT INTO taxi_demo.taxi_trips ({', '.join(INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))})"
+)
+
+# Tipos CQL das colunas gravadas (mesma ordem do INSERT)
+COLUMN_TYPES = dict(zip(INSERT_COLUMNS, (
+    'uuid', 'date', 'text', 'timestamp', 'timestamp', 'int', 'float', 'text', 'text', 'text',
+    'float', 'float', 'float', 'float', 'float', 'float', 'float', 'float', 'float',
+    'int', 'int', 'float', 'timestamp', 'timestamp'
+)))
+
+def duration_minutes(pickup: Optional[datetime], dropoff: Optional[datetime]) -> float:
+    """Duração da viagem em minutos (0.0 sem as duas datas)"""
+    if pickup and dropoff:
+        return (dropoff - pickup).total_seconds() / 60
+    return 0.0
+
+# Buckets numéricos de US$ 10 / 10 milhas; valores acima de MAX_BUCKET caem no último
+BUCKET_SIZE = 10
+MAX_BUCKET = 50
+# Buckets lidos em paralelo por vez nas buscas por valor mínimo (parada ao atingir o limite)
+BUCKET_WAVE = 4
+
+def bucket_of(value: Optional[float]) -> int:
+    """Bucket (chave de partição) de um valor monetário ou de distância"""
+    return min(int((value or 0) // BUCKET_SIZE), MAX_BUCKET)
+
+# Tabelas de consulta desnormalizadas (cópia completa da viagem por chave de consulta):
+# nome -> (chave de partição, coluna de clustering, coluna bucketizada na partição)
+QUERY_TABLES = {
+    'trips_by_vendor': ('vendor_id', 'pickup_date', None),
+    'trips_by_payment': ('payment_type', 'pickup_date', None),
+    'trips_by_rate': ('rate_code_id', 'pickup_date', None),
+    'trips_by_amount': ('amount_bucket', 'total_amount', 'total_amount'),
+    'trips_by_distance': ('distance_bucket', 'trip_distance', 'trip_distance'),
+}
+
+def query_table_cql(name: str) -> str:
+    """DDL de uma tabela de consulta desnormalizada"""
+    partition, clustering, bucketed = QUERY_TABLES[name]
+    columns = {**COLUMN_TYPES, partition: 'int'} if bucketed else COLUMN_TYPES
+    return (
+        f"CREATE TABLE IF NOT EXISTS taxi_demo.{name} ("
+        f"{', '.join(f'{column} {cql_type}' for column, cql_type in columns.items())}, "
+        f"PRIMARY KEY (({partition}), {clustering}, trip_id)"
+        f") WITH CLUSTERING ORDER BY ({clustering} DESC, trip_id ASC)"
+    )
+
+# Colunas que alimentam as estatísticas agregadas
+STATS_COLUMNS = ('total_amount', 'trip_distance', 'passenger_count', 'payment_type', 'rate_code_id', 'trip_duration_minutes')
+
+# Tipos compactos das colunas ao agregar um lote: float32 já é a precisão da coluna CQL
+# float, passageiros cabem em int16 e as colunas categóricas viram códigos uint8 (np.bincount)
+STATS_DTYPES = {
+    'total_amount': np.float32,
+    'trip_distance': np.float32,
+    'passenger_count': np.int16,
+    'payment_type': np.uint8,
+    'rate_code_id': np.uint8,
+    'trip_duration_minutes': np.float32,
+}
+
+# Tabelas de código das colunas categóricas (valores de PaymentType/RateCode em models.py):
+# o código uint8 é a posição na tabela + 1; 0 marca nulo ou valor desconhecido
+CODE_TABLES = {
+    'payment_type': ('1', '2', '3', '4'),
+    'rate_code_id': ('1', '2', '3', '4', '5', '6'),
+}
+_CODE_OF = {
+    column: {value: code for code, value in enumerate(table, 1)}
+    for column, table in CODE_TABLES.items()
+}
+
+# Colunas somadas nos contadores em ponto fixo (counter só guarda inteiros): fator de escala
+STATS_SCALE = {
+    'total_amount': 100,
+    'trip_distance': 100,
+    'trip_duration_minutes': 100,
+}
+
+# Varredura paginada das colunas de estatística (semeadura única dos contadores)
+STATS_CQL = f"SELECT {', '.join(STATS_COLUMNS)} FROM taxi_demo.taxi_trips"
+
+# Posição de cada coluna de estatística nas tuplas do INSERT
+_STATS_POSITIONS = tuple(INSERT_COLUMNS.index(column) for column in STATS_COLUMNS)
+
+def column_array(column: str, values) -> np.ndarray:
+    """Converte valores de uma coluna para o tipo compacto (nulos: NaN ou 0)"""
+    dtype = STATS_DTYPES[column]
+    if column in _CODE_OF:
+        # Lookup na tabela de códigos (map + dict.get em C, sem conversão por valor em Python)
+        return np.fromiter(map(_CODE_OF[column].get, values, repeat(0)), dtype, len(values))
+    if np.issubdtype(dtype, np.integer):
+        return np.nan_to_num(np.array(values, dtype=np.float32)).astype(dtype)
+    return np.array(values, dtype=dtype)
+
+def column_deltas(columns: Dict[str, Any], sign: int = 1) -> Dict[str, int]:
+    """Incrementos dos contadores de estatística para um lote de valores por coluna"""
+    values = {column: column_array(column, columns[column]) for column in STATS_COLUMNS}
+    deltas = {
+        'trips': len(values['total_amount']),
+        'passengers': int(values['passenger_count'].sum(dtype=np.int64)),
+    }
+    for column, scale in STATS_SCALE.items():
+        array = values[column].astype(np.float64)
+        valid = ~np.isnan(array)
+        # Arredondado por linha antes de somar: o total não acumula erro de float
+        deltas[f'{column}_sum'] = int(np.rint(array[valid] * scale).sum())
+        deltas[f'{column}_n'] = int(valid.sum())
+    for column, table in CODE_TABLES.items():
+        counts = np.bincount(values[column], minlength=len(table) + 1)
+        deltas.update({f'{column}:{value}': int(count) for value, count in zip(table, counts[1:])})
+    return {name: sign * delta for name, delta in deltas.items() if delta}
+
+def stats_deltas(rows: List[tuple], sign: int = 1) -> Dict[str, int]:
+    """Incrementos dos contadores de estatística para tuplas na ordem do INSERT"""
+    if not rows:
+        return {}
+    transposed = list(zip(*rows))
+    return column_deltas({column: transposed[position] for column, position in zip(STATS_COLUMNS, _STATS_POSITIONS)}, sign)
+
+def counter_stats(counters: Dict[str, int]) -> Dict[str, Any]:
+    """Estatísticas (no formato de TripStats) a partir dos contadores agregados"""
+    total_trips = counters.get('trips', 0)
+    if total_trips <= 0:
+        return {
+            'total_trips': 0,
+            'total_revenue': 0.0,
+            'avg_trip_distance': 0.0,
+            'avg_trip_duration': 0.0,
+            'most_common_payment_type': '1',
+            'most_common_rate_code': '1',
+            'total_passengers': 0
+        }
+    
+    def average(column: str) -> float:
+        valid = counters.get(f'{column}_n', 0)
+        return counters.get(f'{column}_sum', 0) / STATS_SCALE[column] / valid if valid > 0 else 0.0
+    
+    def most_common(column: str) -> str:
+        return max(CODE_TABLES[column], key=lambda value: counters.get(f'{column}:{value}', 0))
+    
+    return {
+        'total_trips': total_trips,
+        'total_revenue': counters.get('total_amount_sum', 0) / STATS_SCALE['total_amount'],
+        'avg_trip_distance': average('trip_distance'),
+        'avg_trip_duration': average('trip_duration_minutes'),
+        'most_common_payment_type': most_common('payment_type'),
+        'most_common_rate_code': most_common('rate_code_id'),
+        'total_passengers': counters.get('passengers', 0)
+    }
+
+# Filtros opcionais das listagens: nome -> (coluna, operador); a ordem define o bit na máscara
+ROW_FILTERS = {
+    'vendor_id': ('vendor_id', '='),
+    'start_date': ('pickup_datetime', '>='),
+    'end_date': ('pickup_datetime', '<='),
+    'min_amount': ('total_amount', '>='),
+    'max_amount': ('total_amount', '<='),
+    'min_distance': ('trip_distance', '>='),
+    'max_distance': ('trip_distance', '<='),
+    'payment_type': ('payment_type', '='),
+}
+
+@lru_cache(maxsize=256)
+def filter_cql(mask: int) -> str:
+    """SELECT da tabela principal com um bind marker por filtro presente na máscara"""
+    conditions = [
+        f"{column} {operator} ?"
+        for bit, (column, operator) in enumerate(ROW_FILTERS.values())
+        if mask & (1 << bit)
+    ]
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    # Em CQL o LIMIT vem antes do ALLOW FILTERING
+    filtering = " ALLOW FILTERING" if conditions else ""
+    return f"SELECT {', '.join(INSERT_COLUMNS)} FROM taxi_demo.taxi_trips{where} LIMIT ?{filtering}"
+
+# Agregados das viagens em contadores persistidos, numa única partição: compartilhados entre
+# workers e reinícios, atualizados no caminho de escrita e lidos com um único SELECT
+STATS_TABLE_CQL = (
+    "CREATE TABLE IF NOT EXISTS taxi_demo.trip_stats ("
+    "k text, name text, n counter, PRIMARY KEY ((k), name))"
+)
+# Marca (LWT) de que os contadores já receberam as viagens anteriores a eles: um único
+# worker semeia, mesmo com vários processos subindo ao mesmo tempo
+STATS_SEED_CQL = (
+    "CREATE TABLE IF NOT EXISTS taxi_demo.stats_seed (k text PRIMARY KEY, seeded_at timestamp)"
+)
+
+# Statements preparados uma vez no connect e reaproveitados (sem re-parse no servidor)
+STATEMENTS = {
+    'insert_trip': INSERT_CQL,
+    'stats': STATS_CQL,
+    'version': "SELECT release_version FROM system.local",
+    'count': "SELECT COUNT(*) FROM taxi_demo.taxi_trips",
+    'add_stat': "UPDATE taxi_demo.trip_stats SET n = n + ? WHERE k = 'all' AND name = ?",
+    'read_stats': "SELECT name, n FROM taxi_demo.trip_stats WHERE k = 'all'",
+    'trip_count': "SELECT n FROM taxi_demo.trip_stats WHERE k = 'all' AND name = 'trips'",
+    'claim_stats_seed': "INSERT INTO taxi_demo.stats_seed (k, seeded_at) VALUES ('all', ?) IF NOT EXISTS",
+    'release_stats_seed': "DELETE FROM taxi_demo.stats_seed WHERE k = 'all'",
+    # Uma partição (dia) por vez; o filtro por horário fica restrito à partição
+    'select_day_range': (
+        f"SELECT {', '.join(INSERT_COLUMNS)} FROM taxi_demo.taxi_trips "
+        f"WHERE pickup_date = ? AND pickup_datetime >= ? AND pickup_datetime <= ? ALLOW FILTERING"
+    ),
+    'select_trip': (
+        f"SELECT {', '.join(INSERT_COLUMNS)} FROM taxi_demo.taxi_trips "
+        f"WHERE pickup_date = ? AND trip_id = ?"
+    ),
+}
+for _name, (_partition, _clustering, _bucketed) in QUERY_TABLES.items():
+    _columns = (*INSERT_COLUMNS, _partition) if _bucketed else INSERT_COLUMNS
+    _range = f" AND {_clustering} >= ?" if _bucketed else ""
+    STATEMENTS[f'insert_{_name}'] = (
+        f"INSERT INTO taxi_demo.{_name} ({', '.join(_columns)}) "
+        f"VALUES ({', '.join('?' * len(_columns))})"
+    )
+    STATEMENTS[f'select_{_name}'] = (
+        f"SELECT {', '.join(INSERT_COLUMNS)} FROM taxi_demo.{_name} "
+        f"WHERE {_partition} = ?{_range} LIMIT ?"
+    )
+    STATEMENTS[f'delete_{_name}'] = (
+        f"DELETE FROM taxi_demo.{_name} WHERE {_partition} = ? AND {_clustering} = ? AND trip_id = ?"
+    )
+PREPARED: Dict[str, Any] = {}
+
 class TaxiTripModel(Model):
     """
     Modelo CaspyORM para viagens de taxi
@@ -93,19 +356,14 @@ class TaxiTripModel(Model):
     pickup_location_id: Optional[Integer] = Integer()
     dropoff_location_id: Optional[Integer] = Integer()
     
+    # Campo derivado, calculado na gravação (ver duration_minutes)
+    trip_duration_minutes: Float = Float()
+    
     # Campos de auditoria
-    created_at: Timestamp = Timestamp(default=datetime.utcnow)
-    updated_at: Timestamp = Timestamp(default=datetime.utcnow)
+    created_at: Timestamp = Timestamp(default=utc_now)
+    updated_at: Timestamp = Timestamp(default=utc_now)
     
     # Campos calculados (não persistidos)
-    @property
-    def trip_duration_minutes(self) -> float:
-        """Calcula duração da viagem em minutos"""
-        if self.pickup_datetime and self.dropoff_datetime:
-            duration = self.dropoff_datetime - self.pickup_datetime
-            return duration.total_seconds() / 60
-        return 0.0
-    
     @property
     def is_long_trip(self) -> bool:
         """Verifica se é uma viagem longa (>10 milhas)"""
@@ -126,78 +384,427 @@ class TaxiTripModel(Model):
 class TaxiTripManager(Manager[TaxiTripModel]):
     """Manager customizado com métodos de negócio"""
     
+    # Cache de get_stats (leitura dos contadores): (instante monotônico, resultado), válido
+    # por STATS_TTL segundos
+    STATS_TTL = 5.0
+    _stats_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+    _stats_lock: Optional[asyncio.Lock] = None
+    
+    async def _select_rows(self, name: str, *params: Any) -> List[Dict[str, Any]]:
+        """Lê uma única partição de uma tabela de consulta (linhas cruas)"""
+        return list(await execute_async(PREPARED[f'select_{name}'], params))
+    
+    async def _select(self, name: str, *params: Any) -> List[TaxiTripModel]:
+        """Lê uma única partição de uma tabela de consulta"""
+        return [TaxiTripModel(**row) for row in await self._select_rows(name, *params)]
+    
+    async def _select_bucket_rows(self, name: str, min_value: float, limit: int) -> List[Dict[str, Any]]:
+        """Lê os buckets >= min_value do maior para o menor, em ondas, até juntar `limit` linhas"""
+        buckets = range(MAX_BUCKET, bucket_of(min_value) - 1, -1)
+        rows: List[Dict[str, Any]] = []
+        for start in range(0, len(buckets), BUCKET_WAVE):
+            # Cada partição já vem em ordem decrescente e os buckets seguem decrescentes:
+            # a concatenação mantém a ordem; cada leitura pede só o que ainda falta
+            remaining = limit - len(rows)
+            results = await asyncio.gather(*(
+                self._select_rows(name, bucket, min_value, remaining)
+                for bucket in buckets[start:start + BUCKET_WAVE]
+            ))
+            rows.extend(row for page in results for row in page)
+            if len(rows) >= limit:
+                break
+        return rows[:limit]
+    
+    async def _select_buckets(self, name: str, min_value: float, limit: int) -> List[TaxiTripModel]:
+        """Lê os buckets >= min_value do maior para o menor, até juntar `limit` viagens"""
+        return [TaxiTripModel(**row) for row in await self._select_bucket_rows(name, min_value, limit)]
+    
     async def find_by_vendor(self, vendor_id: str, limit: int = 100) -> List[TaxiTripModel]:
         """Busca viagens por fornecedor"""
-        return await self.filter(vendor_id=vendor_id).limit(limit).all()
+        return await self._select('trips_by_vendor', vendor_id, limit)
     
-    async def find_by_date_range(self, start_date: datetime, end_date: datetime) -> List[TaxiTripModel]:
-        """Busca viagens por período"""
-        return await self.filter(
-            pickup_datetime__gte=start_date,
-            pickup_datetime__lte=end_date
-        ).all()
+    async def find_by_payment_type(self, payment_type: str, limit: int = 100) -> List[TaxiTripModel]:
+        """Busca viagens por tipo de pagamento"""
+        return await self._select('trips_by_payment', payment_type, limit)
     
-    async def find_expensive_trips(self, min_amount: float = 50.0) -> List[TaxiTripModel]:
+    async def find_by_rate_code(self, rate_code_id: str, limit: int = 100) -> List[TaxiTripModel]:
+        """Busca viagens por código de tarifa"""
+        return await self._select('trips_by_rate', rate_code_id, limit)
+    
+    async def _stream(self, statement, params: tuple, fetch_size: int = 5000) -> AsyncIterator[Dict[str, Any]]:
+        """Itera as linhas uma a uma, em streaming página a página"""
+        async for rows in self._stream_pages(statement, params, fetch_size):
+            for row in rows:
+                yield row
+    
+    async def _stream_pages(self, statement, params: tuple, fetch_size: int = 5000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Itera as páginas de linhas; a próxima página é buscada enquanto a atual é consumida"""
+        loop = asyncio.get_running_loop()
+        pages: asyncio.Queue = asyncio.Queue()
+        bound = statement.bind(params)
+        bound.fetch_size = fetch_size
+        future = self._session.execute_async(bound)
+        # Callbacks disparados a cada página, na thread de I/O do driver
+        future.add_callbacks(
+            lambda rows: loop.call_soon_threadsafe(pages.put_nowait, (rows, None)),
+            lambda exc: loop.call_soon_threadsafe(pages.put_nowait, (None, exc))
+        )
+        while True:
+            rows, error = await pages.get()
+            if error is not None:
+                raise error
+            has_more = future.has_more_pages
+            if has_more:
+                future.start_fetching_next_page()
+            yield rows
+            if not has_more:
+                return
+    
+    async def iter_date_range_rows(self, start_date: datetime, end_date: datetime,
+                                   fetch_size: int = 5000) -> AsyncIterator[Dict[str, Any]]:
+        """Linhas do período em streaming, uma partição (dia) por vez"""
+        day = start_date.date()
+        while day <= end_date.date():
+            async for row in self._stream(PREPARED['select_day_range'], (day, start_date, end_date), fetch_size):
+                yield row
+            day += timedelta(days=1)
+    
+    async def find_by_date_range(self, start_date: datetime, end_date: datetime) -> AsyncIterator[TaxiTripModel]:
+        """Busca viagens por período (streaming, sem materializar a lista)"""
+        async for row in self.iter_date_range_rows(start_date, end_date):
+            yield TaxiTripModel(**row)
+    
+    async def find_expensive_trips(self, min_amount: float = 50.0, limit: int = 100) -> List[TaxiTripModel]:
         """Busca viagens caras"""
-        return await self.filter(total_amount__gte=min_amount).all()
+        return await self._select_buckets('trips_by_amount', min_amount, limit)
     
-    async def find_long_trips(self, min_distance: float = 10.0) -> List[TaxiTripModel]:
+    async def find_long_trips(self, min_distance: float = 10.0, limit: int = 100) -> List[TaxiTripModel]:
         """Busca viagens longas"""
-        return await self.filter(trip_distance__gte=min_distance).all()
+        return await self._select_buckets('trips_by_distance', min_distance, limit)
+    
+    async def find_expensive_rows(self, min_amount: float = 50.0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Busca viagens caras como linhas cruas (sem instanciar modelos)"""
+        return await self._select_bucket_rows('trips_by_amount', min_amount, limit)
+    
+    async def find_long_rows(self, min_distance: float = 10.0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Busca viagens longas como linhas cruas (sem instanciar modelos)"""
+        return await self._select_bucket_rows('trips_by_distance', min_distance, limit)
+    
+    async def _filter_statement(self, mask: int):
+        """SELECT preparado para o conjunto de filtros presentes (um por máscara)"""
+        ps = self._filter_ps.get(mask)
+        if ps is None:
+            ps = self._filter_ps[mask] = await asyncio.to_thread(self._session.prepare, filter_cql(mask))
+        return ps
+    
+    async def select_rows(self, limit: int, offset: int = 0, **filters: Any) -> List[Dict[str, Any]]:
+        """Lê linhas cruas da tabela principal com os filtros de ROW_FILTERS que não forem None"""
+        values = [filters.get(name) for name in ROW_FILTERS]
+        mask = 0
+        for bit, value in enumerate(values):
+            if value is not None:
+                mask |= 1 << bit
+        ps = await self._filter_statement(mask)
+        # Cassandra não tem OFFSET: lê offset + limit linhas e descarta o início
+        params = (*(value for value in values if value is not None), offset + limit)
+        return list(await execute_async(ps, params))[offset:]
+    
+    def _cached_stats(self) -> Optional[Dict[str, Any]]:
+        if self._stats_cache and time.monotonic() - self._stats_cache[0] < self.STATS_TTL:
+            return self._stats_cache[1]
+        return None
     
     async def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas das viagens, com cache curto e uma única atualização em voo"""
+        stats = self._cached_stats()
+        if stats is not None:
+            return stats
+        
+        if self._stats_lock is None:
+            self._stats_lock = asyncio.Lock()
+        async with self._stats_lock:
+            # Quem esperou o lock reaproveita o resultado da atualização anterior
+            stats = self._cached_stats()
+            if stats is None:
+                stats = await self._query_stats()
+                self._stats_cache = (time.monotonic(), stats)
+            return stats
+    
+    async def _query_stats(self) -> Dict[str, Any]:
         """Calcula estatísticas das viagens"""
-        # Usando queries nativas para performance
-        query = """
-        SELECT 
-            COUNT(*) as total_trips,
-            SUM(total_amount) as total_revenue,
-            AVG(trip_distance) as avg_distance,
-            AVG(total_amount) as avg_amount,
-            COUNT(DISTINCT vendor_id) as unique_vendors
-        FROM taxi_trips
+        # Uma leitura de partição única com todos os contadores agregados
+        rows = await execute_async(PREPARED['read_stats'])
+        return counter_stats({row['name']: row['n'] for row in rows})
+    
+    def prepare_statements(self, session) -> None:
+        """Associa a sessão do driver e o INSERT do registro de statements preparados"""
+        self._session = session
+        self._insert_ps = PREPARED['insert_trip']
+        # UPDATEs preparados sob demanda, um por conjunto de colunas alteradas
+        self._update_ps: Dict[frozenset, Any] = {}
+        # SELECTs das listagens preparados sob demanda, um por máscara de filtros
+        self._filter_ps: Dict[int, Any] = {}
+    
+    @staticmethod
+    def trip_row(trip: TaxiTripModel) -> tuple:
+        """Valores de uma viagem na ordem do INSERT"""
+        return tuple(getattr(trip, column) for column in INSERT_COLUMNS)
+    
+    @staticmethod
+    def frame_rows(frame: Union[pd.DataFrame, pa.Table], now: datetime) -> List[tuple]:
+        """Converte um DataFrame/Table em tuplas do INSERT com operações por coluna"""
+        if isinstance(frame, pa.Table):
+            frame = frame.to_pandas()
+        size = len(frame)
+        
+        pickup = frame['pickup_datetime'].to_numpy(dtype='datetime64[us]')
+        dropoff = frame['dropoff_datetime'].to_numpy(dtype='datetime64[us]')
+        # Duração vetorizada: diferença em µs -> minutos, em float32 como a coluna
+        durations = ((dropoff - pickup).astype(np.int64) / 60e6).astype(np.float32)
+        trip_ids = frame['trip_id'].tolist() if 'trip_id' in frame else [uuid.uuid4() for _ in range(size)]
+        
+        columns = []
+        for column in DATA_COLUMNS:
+            if column not in frame:
+                columns.append(repeat(None, size))
+            elif COLUMN_TYPES[column] == 'float':
+                # Coluna CQL float (32 bits): um único cast por coluna
+                columns.append(frame[column].to_numpy().astype(np.float32, copy=False).tolist())
+            elif COLUMN_TYPES[column] == 'timestamp':
+                columns.append(frame[column].to_numpy(dtype='datetime64[us]').tolist())
+            else:
+                values = frame[column]
+                columns.append(values.astype(object).where(values.notna(), None).tolist())
+        
+        return list(zip(
+            trip_ids,
+            pickup.astype('datetime64[D]').tolist(),
+            *columns,
+            durations.tolist(),
+            repeat(now, size),
+            repeat(now, size)
+        ))
+    
+    @classmethod
+    def to_arrow(cls, trips: List[Union[tuple, TaxiTripModel]]) -> pa.Table:
+        """Tabela Arrow (colunas float em FP32) para análises vetorizadas com pyarrow.compute"""
+        rows = [trip if isinstance(trip, tuple) else cls.trip_row(trip) for trip in trips]
+        columns = list(zip(*rows)) if rows else [()] * len(INSERT_COLUMNS)
+        return pa.table({
+            column: pa.array(values, type=pa.float32()) if COLUMN_TYPES[column] == 'float' else pa.array(values)
+            for column, values in zip(INSERT_COLUMNS, columns)
+        })
+    
+    @staticmethod
+    def struct_rows(trips: List[Any], now: datetime) -> List[tuple]:
+        """Converte objetos com os campos da viagem (ex.: Structs msgspec) em tuplas do INSERT"""
+        data_values = attrgetter(*DATA_COLUMNS)
+        return [
+            (
+                uuid.uuid4(),
+                trip.pickup_datetime.date(),
+                *data_values(trip),
+                duration_minutes(trip.pickup_datetime, trip.dropoff_datetime),
+                now,
+                now
+            )
+            for trip in trips
+        ]
+    
+    @staticmethod
+    def materialize(rows: List[tuple]) -> List[TaxiTripModel]:
+        """Instancia modelos a partir das tuplas do INSERT (fora do caminho de inserção)"""
+        return [TaxiTripModel(**dict(zip(INSERT_COLUMNS, row))) for row in rows]
+    
+    def _copy_statements(self, rows: List[tuple]):
+        """(statement, parâmetros) que gravam cada linha nas tabelas de consulta"""
+        for name, (partition, clustering, bucketed) in QUERY_TABLES.items():
+            ps = PREPARED[f'insert_{name}']
+            if bucketed:
+                value = INSERT_COLUMNS.index(bucketed)
+                yield from ((ps, (*row, bucket_of(row[value]))) for row in rows)
+            else:
+                yield from ((ps, row) for row in rows)
+    
+    def _delete_statements(self, rows: List[tuple]):
+        """(statement, parâmetros) que removem cada linha das tabelas de consulta"""
+        for name, (partition, clustering, bucketed) in QUERY_TABLES.items():
+            ps = PREPARED[f'delete_{name}']
+            key = INSERT_COLUMNS.index(bucketed or partition)
+            order = INSERT_COLUMNS.index(clustering)
+            for row in rows:
+                yield ps, (bucket_of(row[key]) if bucketed else row[key], row[order], row[0])
+    
+    async def _execute_many(self, statements) -> list:
+        """Executa (statement, parâmetros) concorrentes numa thread, registrando falhas"""
+        results = await asyncio.to_thread(
+            execute_concurrent,
+            self._session, statements,
+            concurrency=128, raise_on_first_error=False
+        )
+        failures = [result for success, result in results if not success]
+        if failures:
+            logger.warning(f"{len(failures)} escritas falharam: {failures[0]}")
+        return results
+    
+    async def write_query_tables(self, rows: List[tuple]) -> None:
+        """Grava as cópias desnormalizadas das viagens"""
+        await self._execute_many(self._copy_statements(rows))
+    
+    async def delete_query_tables(self, rows: List[tuple]) -> None:
+        """Remove as cópias desnormalizadas das viagens"""
+        await self._execute_many(self._delete_statements(rows))
+    
+    async def bulk_insert(self, trips_data: Union[List[Dict[str, Any]], pd.DataFrame, pa.Table]) -> int:
+        """Insere múltiplas viagens com statements preparados concorrentes (sem BATCH)"""
+        # Um único instante para created_at/updated_at de todo o lote
+        now = utc_now()
+        # Tuplas na ordem do INSERT, sem instanciar um modelo por linha; só as viagens sem
+        # trip_id informado são novas (com trip_id o INSERT é um upsert e não entra nos agregados)
+        if isinstance(trips_data, (pd.DataFrame, pa.Table)):
+            params = self.frame_rows(trips_data, now)
+            columns = trips_data.column_names if isinstance(trips_data, pa.Table) else trips_data.columns
+            new = repeat('trip_id' not in columns, len(params))
+        else:
+            new = [not data.get('trip_id') for data in trips_data]
+            params = [
+                (
+                    data.get('trip_id') or uuid.uuid4(),
+                    data['pickup_datetime'].date(),
+                    *map(data.get, DATA_COLUMNS),
+                    duration_minutes(data['pickup_datetime'], data.get('dropoff_datetime')),
+                    now,
+                    now
+                )
+                for data in trips_data
+            ]
+        
+        return await self.copy_rows(params, new)
+    
+    async def copy_rows(self, params: List[tuple], new: Optional[Iterable[bool]] = None) -> int:
         """
+        Grava tuplas do INSERT na tabela principal e nas cópias, com escritas concorrentes
         
-        result = await self.raw(query).first()
-        return {
-            'total_trips': result['total_trips'] if result else 0,
-            'total_revenue': float(result['total_revenue']) if result and result['total_revenue'] else 0.0,
-            'avg_distance': float(result['avg_distance']) if result and result['avg_distance'] else 0.0,
-            'avg_amount': float(result['avg_amount']) if result and result['avg_amount'] else 0.0,
-            'unique_vendors': result['unique_vendors'] if result else 0
-        }
+        `new` marca as tuplas de viagens novas, somadas aos agregados (padrão: todas)
+        """
+        # Um único INSERT preparado religado a cada tupla, cada escrita roteada à réplica
+        # dona da partição; as cópias desnormalizadas seguem em paralelo
+        results, _ = await asyncio.gather(
+            asyncio.to_thread(
+                execute_concurrent_with_args,
+                self._session, self._insert_ps, params,
+                concurrency=128, raise_on_first_error=False
+            ),
+            self.write_query_tables(params)
+        )
+        inserted = sum(success for success, _ in results)
+        if inserted < len(params):
+            logger.warning(f"{len(params) - inserted} inserções falharam")
+        if new is None:
+            new = repeat(True)
+        await self.record_rows([
+            row for row, (success, _), is_new in zip(params, results, new) if success and is_new
+        ])
+        return inserted
     
-    async def bulk_create(self, trips_data: List[Dict[str, Any]]) -> List[TaxiTripModel]:
-        """Cria múltiplas viagens em lote"""
-        trips = []
-        for data in trips_data:
-            # Adiciona pickup_date para partição
-            pickup_datetime = data.get('pickup_datetime')
-            if pickup_datetime:
-                data['pickup_date'] = pickup_datetime.date()
-            
-            trip = TaxiTripModel(**data)
-            trips.append(trip)
+    async def add_stats(self, deltas: Dict[str, int]) -> None:
+        """Soma os incrementos aos contadores persistidos (um BATCH COUNTER de partição única)"""
+        if not deltas:
+            return
+        batch = BatchStatement(batch_type=BatchType.COUNTER)
+        for name, delta in deltas.items():
+            batch.add(PREPARED['add_stat'], (delta, name))
+        await execute_async(batch)
+    
+    async def record_rows(self, rows: List[tuple], sign: int = 1) -> None:
+        """Conta tuplas do INSERT gravadas (sign=1) ou removidas (sign=-1) nos agregados"""
+        await self.add_stats(stats_deltas(rows, sign))
+    
+    async def seed_stats(self, fetch_size: int = 5000) -> bool:
+        """
+        Soma aos contadores as viagens gravadas antes deles existirem
         
-        # Insere em lote
-        await self.bulk_create(trips)
-        return trips
+        Varredura paginada feita uma única vez por tabela (o worker que vencer o LWT);
+        em caso de erro a marca é removida e o próximo startup tenta de novo.
+        """
+        claim = await execute_async(PREPARED['claim_stats_seed'], (utc_now(),))
+        if not claim.was_applied:
+            return False
+        try:
+            values_of = itemgetter(*STATS_COLUMNS)
+            deltas = Counter()
+            async for rows in self._stream_pages(PREPARED['stats'], (), fetch_size):
+                if rows:
+                    # Página transposta de linhas para colunas, agregada com NumPy
+                    deltas.update(column_deltas(dict(zip(STATS_COLUMNS, zip(*map(values_of, rows))))))
+            await self.add_stats({name: delta for name, delta in deltas.items() if delta})
+        except Exception:
+            await execute_async(PREPARED['release_stats_seed'])
+            raise
+        return True
     
-    async def update_trip(self, trip_id: str, **kwargs) -> Optional[TaxiTripModel]:
-        """Atualiza uma viagem"""
-        trip = await self.get(trip_id=trip_id)
-        if trip:
-            for key, value in kwargs.items():
-                setattr(trip, key, value)
-            trip.updated_at = datetime.utcnow()
-            await trip.save()
-        return trip
+    async def count_trips(self) -> int:
+        """Total de viagens pelo contador persistido (leitura de uma única célula)"""
+        row = (await execute_async(PREPARED['trip_count'])).one()
+        return row['n'] if row and row['n'] is not None else 0
+    
+    async def _update_statement(self, columns: frozenset):
+        """UPDATE preparado para o conjunto de colunas (ordem de bind: colunas ordenadas)"""
+        ps = self._update_ps.get(columns)
+        if ps is None:
+            assignments = ', '.join(f"{column} = ?" for column in sorted(columns))
+            cql = (
+                f"UPDATE taxi_demo.taxi_trips SET {assignments}, updated_at = ? "
+                f"WHERE pickup_date = ? AND trip_id = ?"
+            )
+            ps = self._update_ps[columns] = await asyncio.to_thread(self._session.prepare, cql)
+        return ps
+    
+    async def update_trip(self, trip_id: uuid.UUID, pickup_date, previous: Optional[tuple] = None,
+                          **kwargs) -> bool:
+        """Atualiza colunas de uma viagem com um UPDATE preparado, sem instanciar o modelo"""
+        invalid = set(kwargs) - set(DATA_COLUMNS)
+        if invalid:
+            raise ValueError(f"Colunas não atualizáveis: {sorted(invalid)}")
+        
+        # A linha anterior só é necessária por causa das cópias desnormalizadas (chaves podem
+        # mudar); quem já leu a viagem passa as tuplas em `previous` e evita a nova leitura
+        if previous is None:
+            row = (await execute_async(PREPARED['select_trip'], (pickup_date, trip_id))).one()
+            if row is None:
+                return False
+            previous = tuple(row[column] for column in INSERT_COLUMNS)
+        
+        now = utc_now()
+        values = {**dict(zip(INSERT_COLUMNS, previous)), **kwargs, 'updated_at': now}
+        if {'pickup_datetime', 'dropoff_datetime'} & kwargs.keys():
+            # Mantém a duração persistida coerente com as novas datas
+            kwargs['trip_duration_minutes'] = values['trip_duration_minutes'] = duration_minutes(
+                values['pickup_datetime'], values['dropoff_datetime']
+            )
+        columns = frozenset(kwargs)
+        ps = await self._update_statement(columns)
+        params = (*(kwargs[column] for column in sorted(columns)), now, pickup_date, trip_id)
+        
+        # UPDATE da tabela principal junto com a remoção das cópias antigas
+        await asyncio.gather(execute_async(ps, params), self.delete_query_tables([previous]))
+        row = tuple(values[column] for column in INSERT_COLUMNS)
+        # Agregados: sai a versão anterior, entra a nova (só os contadores que mudaram)
+        deltas = Counter(stats_deltas([row]))
+        deltas.update(stats_deltas([previous], -1))
+        await asyncio.gather(
+            self.write_query_tables([row]),
+            self.add_stats({name: delta for name, delta in deltas.items() if delta})
+        )
+        return True
     
     async def delete_trip(self, trip_id: str) -> bool:
         """Deleta uma viagem"""
         trip = await self.get(trip_id=trip_id)
         if trip:
             await trip.delete()
+            row = self.trip_row(trip)
+            await asyncio.gather(self.delete_query_tables([row]), self.record_rows([row], -1))
             return True
         return False
 
@@ -207,6 +814,10 @@ class DatabaseManager:
     
     def __init__(self):
         self.connection = None
+        # Sessão do driver (a do execute_async), única para todos os prepares
+        self.session = None
+        # Semeadura dos contadores de estatística, em segundo plano
+        self._seed_task: Optional[asyncio.Task] = None
         self.taxi_trips = TaxiTripManager(TaxiTripModel)
     
     async def connect(self) -> None:
@@ -214,6 +825,7 @@ class DatabaseManager:
         try:
             logger.info("Conectando ao Cassandra...")
             self.connection = await connect_async(**CASSANDRA_CONFIG)
+            self.session = get_async_session()
             logger.info("Conectado com sucesso!")
             
             # Cria keyspace se não existir
@@ -222,16 +834,39 @@ class DatabaseManager:
             # Cria tabela se não existir
             await self._create_table()
             
+            # Prepara statements após a tabela existir
+            await self._prepare_statements()
+            self.taxi_trips.prepare_statements(self.session)
+            # Fora do caminho do startup: uma falha na varredura não impede a aplicação de subir
+            self._seed_task = asyncio.create_task(self._seed_stats())
+            
         except Exception as e:
             logger.error(f"Erro ao conectar: {e}")
             raise
     
+    async def _seed_stats(self) -> None:
+        """Semeia os contadores de estatística, registrando falhas sem propagar"""
+        try:
+            if await self.taxi_trips.seed_stats():
+                logger.info("Contadores de estatística semeados com as viagens existentes")
+        except Exception as e:
+            logger.warning(f"Erro ao semear contadores de estatística: {e}")
+    
     async def disconnect(self) -> None:
         """Desconecta do Cassandra"""
+        if self._seed_task and not self._seed_task.done():
+            self._seed_task.cancel()
         if self.connection:
             await disconnect_async()
             logger.info("Desconectado do Cassandra")
     
+    async def _prepare_statements(self) -> None:
+        """Prepara todos os statements do registro uma única vez"""
+        for name, cql in STATEMENTS.items():
+            if name not in PREPARED:
+                PREPARED[name] = await asyncio.to_thread(self.session.prepare, cql)
+        logger.info(f"{len(PREPARED)} statements preparados")
+    
     async def _create_keyspace(self) -> None:
         """Cria o keyspace se não existir"""
         create_keyspace_query = """
@@ -269,6 +904,7 @@ class DatabaseManager:
             airport_fee float,
             pickup_location_id int,
             dropoff_location_id int,
+            trip_duration_minutes float,
             created_at timestamp,
             updated_at timestamp,
             PRIMARY KEY ((pickup_date), trip_id)
@@ -277,48 +913,77 @@ class DatabaseManager:
         await self.connection.execute(create_table_query)
         logger.info("Tabela 'taxi_trips' criada/verificada")
         
+        # Tabelas de consulta desnormalizadas (leitura por chave de partição, sem índice)
+        for name in QUERY_TABLES:
+            await self.connection.execute(query_table_cql(name))
+            logger.info(f"Tabela '{name}' criada/verificada")
+        
+        await self.connection.execute(STATS_TABLE_CQL)
+        await self.connection.execute(STATS_SEED_CQL)
+        logger.info("Tabelas 'trip_stats' e 'stats_seed' criadas/verificadas")
+        
         # Cria índices secundários
         await self._create_indexes()
     
     async def _create_indexes(self) -> None:
-        """Cria índices secundários para consultas eficientes"""
-        indexes = [
-            "CREATE INDEX IF NOT EXISTS ON taxi_demo.taxi_trips (vendor_id)",
-            "CREATE INDEX IF NOT EXISTS ON taxi_demo.taxi_trips (payment_type)",
-            "CREATE INDEX IF NOT EXISTS ON taxi_demo.taxi_trips (rate_code_id)",
-            "CREATE INDEX IF NOT EXISTS ON taxi_demo.taxi_trips (total_amount)",
-            "CREATE INDEX IF NOT EXISTS ON taxi_demo.taxi_trips (trip_distance)"
-        ]
+        """Cria índices secundários para os filtros ad hoc de listagem/busca"""
+        # Sem índices em colunas float: valor e distância são lidos pelas tabelas por bucket
+        indexed_columns = ['vendor_id', 'payment_type', 'rate_code_id']
+        
+        # Índices já existentes não precisam do DDL (nem da espera por acordo de schema)
+        existing = await self.connection.execute(
+            "SELECT options FROM system_schema.indexes "
+            "WHERE keyspace_name = 'taxi_demo' AND table_name = 'taxi_trips'"
+        )
+        targets = {row['options'].get('target') for row in existing}
+        missing = [column for column in indexed_columns if column not in targets]
+        if not missing:
+            logger.info("Índices secundários já existem")
+            return
         
-        for index_query in indexes:
-            try:
-                await self.connection.execute(index_query)
-                logger.info(f"Índice criado: {index_query.split('(')[1].split(')')[0]}")
-            except Exception as e:
-                logger.warning(f"Erro ao criar índice: {e}")
-    
-    async def health_check(self) -> Dict[str, Any]:
-        """Verifica saúde da conexão"""
+        # DDLs restantes em paralelo
+        results = await asyncio.gather(
+            *(
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS ON taxi_demo.taxi_trips ({column})")
+                for column in missing
+            ),
+            return_exceptions=True
+        )
+        for column, result in zip(missing, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Erro ao criar índice {column}: {result}")
+            else:
+                logger.info(f"Índice criado: {column}")
+    
+    async def health_check(self, full: bool = False) -> Dict[str, Any]:
+        """Verifica saúde da conexão (full=True faz a contagem real, só para depuração)"""
         try:
-            # Testa conexão
-            result = await self.connection.execute("SELECT release_version FROM system.local")
+            # Testa conexão: consulta de uma linha em system.local, tempo constante
+            result = await self.connection.execute(PREPARED['version'])
             version = result.one()['release_version']
             
-            # Testa contagem de registros
-            count_result = await self.connection.execute("SELECT COUNT(*) FROM taxi_demo.taxi_trips")
-            total_trips = count_result.one()['count']
+            if full:
+                # COUNT(*) varre o cluster inteiro: O(linhas)
+                count_result = await self.connection.execute(PREPARED['count'])
+                total_trips = count_result.one()['count']
+                # Reconcilia o contador persistido com a contagem real
+                counted = await self.taxi_trips.count_trips()
+                if total_trips != counted:
+                    await self.taxi_trips.add_stats({'trips': total_trips - counted})
+            else:
+                total_trips = await self.taxi_trips.count_trips()
             
             return {
                 'status': 'healthy',
                 'cassandra_version': version,
                 'total_trips': total_trips,
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': iso_now()
             }
         except Exception as e:
             return {
                 'status': 'unhealthy',
                 'error': str(e),
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': iso_now()
             }
 
 # Instância global
@@ -326,17 +991,18 @@ db_manager = DatabaseManager()
 
 # Context manager para conexão
 class DatabaseContext:
-    """Context manager para gerenciar conexão"""
+    """Context manager que entrega a conexão de longa duração aberta no lifespan"""
     
     def __init__(self):
         self.db = db_manager
     
     async def __aenter__(self):
-        await self.db.connect()
+        # Sessão única por processo: não conecta nem desconecta por uso
+        assert self.db.connection is not None, "db_manager não conectado (init_database no lifespan)"
         return self.db
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.db.disconnect()
+        return None
 
 # Função de inicialização
 async def init_database() -> DatabaseManager:
@@ -3,9 +3,11 @@
 Modelos CaspyORM - Demonstração de Sintaxe Moderna
 """
 
-from pydantic import BaseModel, Field, validator
+import msgspec
+from dataclasses import dataclass
+from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List
+from typing import Annotated, Literal, Optional, List
 from enum import Enum
 
 # Enums para validação
@@ -23,115 +25,121 @@ class RateCode(str, Enum):
     NEGOTIATED = "5"
     GROUP_RIDE = "6"
 
+# Valores dos enums como Literal: o msgspec valida por pertinência a um conjunto em C
+# e entrega a própria string, sem coerção nem instância de Enum por campo
+PaymentTypeValue = Literal[tuple(member.value for member in PaymentType)]
+RateCodeValue = Literal[tuple(member.value for member in RateCode)]
+
+# Restrições reutilizadas (validadas em C pelo msgspec)
+NonNegativeFloat = Annotated[float, msgspec.Meta(ge=0.0)]
+LocationId = Optional[Annotated[int, msgspec.Meta(ge=1)]]
+
+# Diferença máxima aceita entre total_amount e a soma das parcelas (1 centavo)
+TOTAL_TOLERANCE = 0.01
+
+def total_matches(fare: float, extra: float, mta_tax: float, tip: float, tolls: float,
+                  improvement: float, congestion: float, airport: float, total: float) -> bool:
+    """Confere o total contra a soma das parcelas (floats já decodificados, sem lookups)"""
+    return abs(total - (fare + extra + mta_tax + tip + tolls + improvement + congestion + airport)) <= TOTAL_TOLERANCE
+
+def check_trip(trip, check_total: bool) -> None:
+    """Validações entre campos (desembarque após embarque e total consistente)"""
+    if trip.dropoff_datetime <= trip.pickup_datetime:
+        raise ValueError('dropoff_datetime deve ser posterior ao pickup_datetime')
+    if check_total and not total_matches(
+        trip.fare_amount, trip.extra, trip.mta_tax, trip.tip_amount, trip.tolls_amount,
+        trip.improvement_surcharge, trip.congestion_surcharge, trip.airport_fee, trip.total_amount
+    ):
+        expected_total = (
+            trip.fare_amount + trip.extra + trip.mta_tax + trip.tip_amount + trip.tolls_amount +
+            trip.improvement_surcharge + trip.congestion_surcharge + trip.airport_fee
+        )
+        raise ValueError(f'Total amount deve ser {expected_total:.2f}, recebido {trip.total_amount:.2f}')
+
 # Modelo principal com validações avançadas
-class TaxiTrip(BaseModel):
+class TaxiTrip(msgspec.Struct, kw_only=True, gc=False):
     """Modelo de viagem de taxi com validações CaspyORM"""
     
     # Campos obrigatórios com validações
-    vendor_id: str = Field(..., description="ID do fornecedor", min_length=1, max_length=10)
-    pickup_datetime: datetime = Field(..., description="Data/hora de embarque")
-    dropoff_datetime: datetime = Field(..., description="Data/hora de desembarque")
+    vendor_id: Annotated[str, msgspec.Meta(min_length=1, max_length=10, description="ID do fornecedor")]
+    pickup_datetime: datetime
+    dropoff_datetime: datetime
     
     # Campos numéricos com validações
-    passenger_count: int = Field(..., ge=0, le=10, description="Número de passageiros")
-    trip_distance: float = Field(..., ge=0.0, le=1000.0, description="Distância da viagem em milhas")
-    rate_code_id: RateCode = Field(..., description="Código da tarifa")
+    passenger_count: Annotated[int, msgspec.Meta(ge=0, le=10, description="Número de passageiros")]
+    trip_distance: Annotated[float, msgspec.Meta(ge=0.0, le=1000.0, description="Distância da viagem em milhas")]
+    rate_code_id: RateCodeValue
     
     # Campos de texto
-    store_and_fwd_flag: str = Field(..., max_length=1, description="Flag de armazenamento")
-    payment_type: PaymentType = Field(..., description="Tipo de pagamento")
+    store_and_fwd_flag: Annotated[str, msgspec.Meta(max_length=1, description="Flag de armazenamento")]
+    payment_type: PaymentTypeValue
     
     # Campos monetários
-    fare_amount: float = Field(..., ge=0.0, description="Valor da tarifa")
-    extra: float = Field(0.0, ge=0.0, description="Taxa extra")
-    mta_tax: float = Field(0.0, ge=0.0, description="Imposto MTA")
-    tip_amount: float = Field(0.0, ge=0.0, description="Gorjeta")
-    tolls_amount: float = Field(0.0, ge=0.0, description="Pedágios")
-    improvement_surcharge: float = Field(0.0, ge=0.0, description="Taxa de melhoria")
-    total_amount: float = Field(..., ge=0.0, description="Valor total")
-    congestion_surcharge: float = Field(0.0, ge=0.0, description="Taxa de congestionamento")
-    airport_fee: float = Field(0.0, ge=0.0, description="Taxa de aeroporto")
+    fare_amount: NonNegativeFloat
+    extra: NonNegativeFloat = 0.0
+    mta_tax: NonNegativeFloat = 0.0
+    tip_amount: NonNegativeFloat = 0.0
+    tolls_amount: NonNegativeFloat = 0.0
+    improvement_surcharge: NonNegativeFloat = 0.0
+    total_amount: NonNegativeFloat
+    congestion_surcharge: NonNegativeFloat = 0.0
+    airport_fee: NonNegativeFloat = 0.0
     
     # Campos opcionais
-    pickup_location_id: Optional[int] = Field(None, ge=1, description="ID da localização de embarque")
-    dropoff_location_id: Optional[int] = Field(None, ge=1, description="ID da localização de desembarque")
+    pickup_location_id: LocationId = None
+    dropoff_location_id: LocationId = None
     
-    # Validações customizadas
-    @validator('dropoff_datetime')
-    def dropoff_after_pickup(cls, v, values):
-        """Valida se o desembarque é após o embarque"""
-        if 'pickup_datetime' in values and v <= values['pickup_datetime']:
-            raise ValueError('dropoff_datetime deve ser posterior ao pickup_datetime')
-        return v
-    
-    @validator('total_amount')
-    def validate_total_amount(cls, v, values):
-        """Valida se o total está correto"""
-        if 'fare_amount' in values:
-            expected_total = (
-                values.get('fare_amount', 0) +
-                values.get('extra', 0) +
-                values.get('mta_tax', 0) +
-                values.get('tip_amount', 0) +
-                values.get('tolls_amount', 0) +
-                values.get('improvement_surcharge', 0) +
-                values.get('congestion_surcharge', 0) +
-                values.get('airport_fee', 0)
-            )
-            if abs(v - expected_total) > 0.01:  # Tolerância de 1 centavo
-                raise ValueError(f'Total amount deve ser {expected_total:.2f}, recebido {v:.2f}')
-        return v
-    
-    class Config:
-        """Configurações do modelo"""
-        # Exemplo de uso
-        schema_extra = {
-            "example": {
-                "vendor_id": "1",
-                "pickup_datetime": "2024-01-01T12:00:00",
-                "dropoff_datetime": "2024-01-01T12:30:00",
-                "passenger_count": 2,
-                "trip_distance": 5.5,
-                "rate_code_id": "1",
-                "store_and_fwd_flag": "N",
-                "payment_type": "1",
-                "fare_amount": 15.50,
-                "extra": 1.0,
-                "mta_tax": 0.5,
-                "tip_amount": 3.0,
-                "tolls_amount": 0.0,
-                "improvement_surcharge": 1.0,
-                "total_amount": 21.0,
-                "congestion_surcharge": 2.5,
-                "airport_fee": 0.0
-            }
-        }
+    def __post_init__(self):
+        # ValueError vira msgspec.ValidationError na decodificação
+        check_trip(self, check_total=True)
+
+# Exemplo de uso (documentação OpenAPI)
+TRIP_EXAMPLE = {
+    "vendor_id": "1",
+    "pickup_datetime": "2024-01-01T12:00:00",
+    "dropoff_datetime": "2024-01-01T12:30:00",
+    "passenger_count": 2,
+    "trip_distance": 5.5,
+    "rate_code_id": "1",
+    "store_and_fwd_flag": "N",
+    "payment_type": "1",
+    "fare_amount": 15.50,
+    "extra": 1.0,
+    "mta_tax": 0.5,
+    "tip_amount": 3.0,
+    "tolls_amount": 0.0,
+    "improvement_surcharge": 1.0,
+    "total_amount": 21.0,
+    "congestion_surcharge": 2.5,
+    "airport_fee": 0.0
+}
 
 # Modelo para criação (sem campos calculados)
-class TaxiTripCreate(BaseModel):
+class TaxiTripCreate(msgspec.Struct, kw_only=True, gc=False):
     """Modelo para criação de viagem (sem validações de total)"""
-    vendor_id: str = Field(..., description="ID do fornecedor")
-    pickup_datetime: datetime = Field(..., description="Data/hora de embarque")
-    dropoff_datetime: datetime = Field(..., description="Data/hora de desembarque")
-    passenger_count: int = Field(..., ge=0, le=10)
-    trip_distance: float = Field(..., ge=0.0)
-    rate_code_id: RateCode = Field(...)
-    store_and_fwd_flag: str = Field(..., max_length=1)
-    payment_type: PaymentType = Field(...)
-    fare_amount: float = Field(..., ge=0.0)
-    extra: float = Field(0.0, ge=0.0)
-    mta_tax: float = Field(0.0, ge=0.0)
-    tip_amount: float = Field(0.0, ge=0.0)
-    tolls_amount: float = Field(0.0, ge=0.0)
-    improvement_surcharge: float = Field(0.0, ge=0.0)
-    total_amount: float = Field(..., ge=0.0)
-    congestion_surcharge: float = Field(0.0, ge=0.0)
-    airport_fee: float = Field(0.0, ge=0.0)
-    pickup_location_id: Optional[int] = Field(None, ge=1)
-    dropoff_location_id: Optional[int] = Field(None, ge=1)
+    vendor_id: str
+    pickup_datetime: datetime
+    dropoff_datetime: datetime
+    passenger_count: Annotated[int, msgspec.Meta(ge=0, le=10)]
+    trip_distance: NonNegativeFloat
+    rate_code_id: RateCodeValue
+    store_and_fwd_flag: Annotated[str, msgspec.Meta(max_length=1)]
+    payment_type: PaymentTypeValue
+    fare_amount: NonNegativeFloat
+    extra: NonNegativeFloat = 0.0
+    mta_tax: NonNegativeFloat = 0.0
+    tip_amount: NonNegativeFloat = 0.0
+    tolls_amount: NonNegativeFloat = 0.0
+    improvement_surcharge: NonNegativeFloat = 0.0
+    total_amount: NonNegativeFloat
+    congestion_surcharge: NonNegativeFloat = 0.0
+    airport_fee: NonNegativeFloat = 0.0
+    pickup_location_id: LocationId = None
+    dropoff_location_id: LocationId = None
 
-# Modelo para resposta
-class TaxiTripResponse(BaseModel):
+# Modelo para resposta (montado a partir de dados já validados; serializado direto pelo orjson)
+@dataclass(slots=True)
+class TaxiTripResponse:
     """Modelo de resposta com campos calculados"""
     id: str  # ID único da viagem
     vendor_id: str
@@ -169,25 +177,18 @@ class TripStats(BaseModel):
     total_passengers: int
 
 # Modelo para consultas
-class TripQuery(BaseModel):
+class TripQuery(msgspec.Struct, kw_only=True, gc=False):
     """Parâmetros de consulta"""
     vendor_id: Optional[str] = None
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     min_distance: Optional[float] = None
     max_distance: Optional[float] = None
-    payment_type: Optional[PaymentType] = None
-    limit: int = Field(default=100, ge=1, le=1000)
-    offset: int = Field(default=0, ge=0)
+    payment_type: Optional[PaymentTypeValue] = None
+    limit: Annotated[int, msgspec.Meta(ge=1, le=1000)] = 100
+    offset: Annotated[int, msgspec.Meta(ge=0)] = 0
 
 # Modelo para bulk operations
-class BulkTripCreate(BaseModel):
-    """Modelo para inserção em lote"""
-    trips: List[TaxiTripCreate] = Field(..., min_length=1, max_length=1000)
-    
-    @validator('trips')
-    def validate_trips(cls, v):
-        """Valida lista de viagens"""
-        if len(v) > 1000:
-            raise ValueError('Máximo de 1000 viagens por operação em lote')
-        return v 
\ No newline at end of file
+class BulkTripCreate(msgspec.Struct, gc=False):
+    """Modelo para inserção em lote (máximo de 1000 viagens por operação)"""
+    trips: Annotated[List[TaxiTripCreate], msgspec.Meta(min_length=1, max_length=1000)]
@@ -4,55 +4,133 @@ Rotas da API - CaspyORM Demo
 Demonstração de operações CRUD com sintaxe moderna
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import asyncio
 import logging
+from dataclasses import fields
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+import msgspec
+import orjson
 
 from .models import (
     TaxiTrip, TaxiTripCreate, TaxiTripResponse, 
     TripStats, TripQuery, BulkTripCreate
 )
-from .database import db_manager, TaxiTripManager
+from .database import db_manager, TaxiTripManager, utc_now
 from .services import TaxiTripService
 
 # Configuração
-router = APIRouter(prefix="/api/v1/caspyorm", tags=["CaspyORM Demo"])
+router = APIRouter(prefix="/api/v1/caspyorm", tags=["CaspyORM Demo"], default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
+# Corpos decodificados e validados pelo msgspec (decoders criados uma única vez)
+TRIP_DECODER = msgspec.json.Decoder(TaxiTripCreate)
+BULK_DECODER = msgspec.json.Decoder(BulkTripCreate)
+QUERY_DECODER = msgspec.json.Decoder(TripQuery)
+
+# Schemas dos corpos msgspec, mesclados em components/schemas pelo custom_openapi
+(TRIP_BODY_SCHEMA, BULK_BODY_SCHEMA, QUERY_BODY_SCHEMA), BODY_SCHEMA_COMPONENTS = msgspec.json.schema_components(
+    (TaxiTripCreate, BulkTripCreate, TripQuery),
+    ref_template="#/components/schemas/{name}"
+)
+
+def body_openapi(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Documenta no OpenAPI um corpo JSON lido diretamente do request"""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
+
+async def decode_body(request: Request, decoder: msgspec.json.Decoder):
+    """Decodifica o corpo do request; erros de validação viram 422 e JSON inválido 400"""
+    body = await request.body()
+    try:
+        return decoder.decode(body)
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+
+# Campos da resposta na ordem do dataclass; o id vem do trip_id (UUID vira string no orjson)
+RESPONSE_KEYS = tuple(field.name for field in fields(TaxiTripResponse))
+_RESPONSE_COLUMNS = tuple('trip_id' if key == 'id' else key for key in RESPONSE_KEYS)
+_response_values = attrgetter(*_RESPONSE_COLUMNS)
+_row_values = itemgetter(*_RESPONSE_COLUMNS)
+
+def _build_response(trip) -> TaxiTripResponse:
+    """Monta a resposta lendo os atributos da viagem (sem .dict() nem nova validação)"""
+    return TaxiTripResponse(*_response_values(trip))
+
+def rows_to_response_bytes(rows: List[Dict[str, Any]]) -> bytes:
+    """Serializa linhas cruas do driver em JSON numa única passada (sem modelos)"""
+    return orjson.dumps([dict(zip(RESPONSE_KEYS, values)) for values in map(_row_values, rows)])
+
+def rows_response(rows: List[Dict[str, Any]]) -> Response:
+    """Resposta JSON de linhas cruas do driver"""
+    return Response(content=rows_to_response_bytes(rows), media_type="application/json")
+
+# Documenta o corpo das rotas que devolvem respostas já serializadas (response_model=None)
+TRIP_RESPONSES = {200: {"model": TaxiTripResponse}}
+TRIP_LIST_RESPONSES = {200: {"model": List[TaxiTripResponse]}}
+
 # Dependências
 async def get_db() -> TaxiTripManager:
     """Dependência para obter o manager do banco"""
     return db_manager.taxi_trips
 
+@lru_cache(maxsize=1)
+def _cached_service() -> TaxiTripService:
+    """Service único do processo (sem estado por request; o manager é fixo no db_manager)"""
+    return TaxiTripService(db_manager.taxi_trips)
+
 async def get_service() -> TaxiTripService:
     """Dependência para obter o service"""
-    return TaxiTripService(db_manager.taxi_trips)
+    return _cached_service()
 
 # Rotas de CRUD básico
-@router.post("/trips", response_model=TaxiTripResponse, status_code=201)
+@router.post("/trips", response_model=None, status_code=201, responses={201: {"model": TaxiTripResponse}},
+             openapi_extra=body_openapi(TRIP_BODY_SCHEMA))
 async def create_trip(
-    trip_data: TaxiTripCreate,
+    request: Request,
     service: TaxiTripService = Depends(get_service)
 ):
     """
     Cria uma nova viagem de taxi
     
     **Pontos fortes da CaspyORM:**
-    - Validação automática com Pydantic
+    - Validação automática com msgspec
     - Conversão automática de tipos
     - Tratamento de erros elegante
     """
+    trip_data = await decode_body(request, TRIP_DECODER)
     try:
         trip = await service.create_trip(trip_data)
-        return TaxiTripResponse(**trip.dict(), trip_duration_minutes=trip.trip_duration_minutes)
+        return ORJSONResponse(_build_response(trip), status_code=201)
     except Exception as e:
         logger.error(f"Erro ao criar viagem: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/trips/{trip_id}", response_model=TaxiTripResponse)
+@router.get("/trips/stream")
+async def stream_trips(
+    start_date: datetime = Query(..., description="Data inicial"),
+    end_date: datetime = Query(..., description="Data final"),
+    manager: TaxiTripManager = Depends(get_db)
+):
+    """
+    Viagens de um período em NDJSON (uma viagem por linha)
+    
+    **Pontos fortes da CaspyORM:**
+    - Streaming página a página (memória constante)
+    - Próxima página buscada enquanto a atual é enviada
+    """
+    async def ndjson():
+        async for row in manager.iter_date_range_rows(start_date, end_date):
+            yield orjson.dumps(row) + b"\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/trips/{trip_id}", response_model=None, responses=TRIP_RESPONSES)
 async def get_trip(
     trip_id: str,
     service: TaxiTripService = Depends(get_service)
@@ -68,9 +146,9 @@ async def get_trip(
     if not trip:
         raise HTTPException(status_code=404, detail="Viagem não encontrada")
     
-    return TaxiTripResponse(**trip.dict(), trip_duration_minutes=trip.trip_duration_minutes)
+    return ORJSONResponse(_build_response(trip))
 
-@router.get("/trips", response_model=List[TaxiTripResponse])
+@router.get("/trips", response_model=None, responses=TRIP_LIST_RESPONSES)
 async def list_trips(
     vendor_id: Optional[str] = Query(None, description="Filtrar por fornecedor"),
     start_date: Optional[datetime] = Query(None, description="Data inicial"),
@@ -89,7 +167,7 @@ async def list_trips(
     - Paginação automática
     - Queries otimizadas
     """
-    trips = await service.list_trips(
+    rows = await service.list_trips_raw(
         vendor_id=vendor_id,
         start_date=start_date,
         end_date=end_date,
@@ -99,15 +177,13 @@ async def list_trips(
         offset=offset
     )
     
-    return [
-        TaxiTripResponse(**trip.dict(), trip_duration_minutes=trip.trip_duration_minutes)
-        for trip in trips
-    ]
+    return rows_response(rows)
 
-@router.put("/trips/{trip_id}", response_model=TaxiTripResponse)
+@router.put("/trips/{trip_id}", response_model=None, responses=TRIP_RESPONSES,
+            openapi_extra=body_openapi(TRIP_BODY_SCHEMA))
 async def update_trip(
     trip_id: str,
-    trip_data: TaxiTripCreate,
+    request: Request,
     service: TaxiTripService = Depends(get_service)
 ):
     """
@@ -118,11 +194,12 @@ async def update_trip(
     - Validação automática
     - Timestamps automáticos
     """
+    trip_data = await decode_body(request, TRIP_DECODER)
     trip = await service.update_trip(trip_id, trip_data)
     if not trip:
         raise HTTPException(status_code=404, detail="Viagem não encontrada")
     
-    return TaxiTripResponse(**trip.dict(), trip_duration_minutes=trip.trip_duration_minutes)
+    return ORJSONResponse(_build_response(trip))
 
 @router.delete("/trips/{trip_id}", status_code=204)
 async def delete_trip(
@@ -141,10 +218,10 @@ async def delete_trip(
         raise HTTPException(status_code=404, detail="Viagem não encontrada")
 
 # Rotas de operações em lote
-@router.post("/trips/bulk", response_model=Dict[str, Any], status_code=201)
+@router.post("/trips/bulk", status_code=201,
+             openapi_extra=body_openapi(BULK_BODY_SCHEMA))
 async def bulk_create_trips(
-    bulk_data: BulkTripCreate,
-    background_tasks: BackgroundTasks,
+    request: Request,
     service: TaxiTripService = Depends(get_service)
 ):
     """
@@ -155,14 +232,16 @@ async def bulk_create_trips(
     - Processamento assíncrono
     - Validação em lote
     """
+    # Lista inteira validada numa única decodificação
+    bulk_data = await decode_body(request, BULK_DECODER)
     try:
-        # Processa em background para não bloquear
-        background_tasks.add_task(service.bulk_create_trips, bulk_data.trips)
+        # Gravação aguardada: a resposta já traz quantas viagens foram inseridas
+        inserted = await service.bulk_copy_trips(bulk_data.trips)
         
         return {
-            "message": f"Inserção de {len(bulk_data.trips)} viagens iniciada",
-            "count": len(bulk_data.trips),
-            "status": "processing"
+            "message": f"{inserted} de {len(bulk_data.trips)} viagens inseridas",
+            "count": inserted,
+            "status": "completed"
         }
     except Exception as e:
         logger.error(f"Erro no bulk create: {e}")
@@ -185,9 +264,10 @@ async def get_bulk_status():
     }
 
 # Rotas de consultas avançadas
-@router.get("/trips/search", response_model=List[TaxiTripResponse])
+@router.get("/trips/search", response_model=None, responses=TRIP_LIST_RESPONSES,
+            openapi_extra=body_openapi(QUERY_BODY_SCHEMA))
 async def search_trips(
-    query: TripQuery,
+    request: Request,
     service: TaxiTripService = Depends(get_service)
 ):
     """
@@ -198,13 +278,11 @@ async def search_trips(
     - Filtros combinados
     - Ordenação flexível
     """
-    trips = await service.search_trips(query)
-    return [
-        TaxiTripResponse(**trip.dict(), trip_duration_minutes=trip.trip_duration_minutes)
-        for trip in trips
-    ]
+    query = await decode_body(request, QUERY_DECODER)
+    rows = await service.search_trips(query)
+    return rows_response(rows)
 
-@router.get("/trips/expensive", response_model=List[TaxiTripResponse])
+@router.get("/trips/expensive", response_model=None, responses=TRIP_LIST_RESPONSES)
 async def get_expensive_trips(
     min_amount: float = Query(50.0, description="Valor mínimo"),
     limit: int = Query(100, ge=1, le=1000),
@@ -217,13 +295,10 @@ async def get_expensive_trips(
     - Queries otimizadas por índice
     - Filtros numéricos eficientes
     """
-    trips = await service.get_expensive_trips(min_amount, limit)
-    return [
-        TaxiTripResponse(**trip.dict(), trip_duration_minutes=trip.trip_duration_minutes)
-        for trip in trips
-    ]
+    rows = await service.get_expensive_trips(min_amount, limit)
+    return rows_response(rows)
 
-@router.get("/trips/long", response_model=List[TaxiTripResponse])
+@router.get("/trips/long", response_model=None, responses=TRIP_LIST_RESPONSES)
 async def get_long_trips(
     min_distance: float = Query(10.0, description="Distância mínima em milhas"),
     limit: int = Query(100, ge=1, le=1000),
@@ -236,14 +311,11 @@ async def get_long_trips(
     - Filtros por distância
     - Ordenação por duração
     """
-    trips = await service.get_long_trips(min_distance, limit)
-    return [
-        TaxiTripResponse(**trip.dict(), trip_duration_minutes=trip.trip_duration_minutes)
-        for trip in trips
-    ]
+    rows = await service.get_long_trips(min_distance, limit)
+    return rows_response(rows)
 
 # Rotas de estatísticas
-@router.get("/stats", response_model=TripStats)
+@router.get("/stats", response_model=None, responses={200: {"model": TripStats}})
 async def get_stats(
     service: TaxiTripService = Depends(get_service)
 ):
@@ -256,7 +328,8 @@ async def get_stats(
     - Cache automático
     """
     stats = await service.get_stats()
-    return TripStats(**stats)
+    # O dict já tem os campos de TripStats; serializado direto pelo orjson
+    return ORJSONResponse(stats)
 
 @router.get("/stats/daily")
 async def get_daily_stats(
@@ -270,7 +343,7 @@ async def get_daily_stats(
     - Agregações por período
     - Queries de série temporal
     """
-    end_date = datetime.utcnow()
+    end_date = utc_now()
     start_date = end_date - timedelta(days=days)
     
     stats = await service.get_daily_stats(start_date, end_date)
@@ -325,7 +398,7 @@ async def compare_performance(
 
 # Rotas de saúde e monitoramento
 @router.get("/health")
-async def health_check():
+async def health_check(full: bool = False):
     """
     Verifica saúde da aplicação
     
@@ -334,7 +407,7 @@ async def health_check():
     - Métricas de performance
     - Status detalhado
     """
-    health = await db_manager.health_check()
+    health = await db_manager.health_check(full=full)
     return health
 
 @router.get("/metrics")
@@ -368,7 +441,7 @@ async def syntax_demo():
             "read": "trips = await manager.filter(vendor_id='1').all()",
             "update": "await trip.update(fare_amount=25.0)",
             "delete": "await trip.delete()",
-            "bulk": "await manager.bulk_create(trips)",
+            "bulk": "await manager.bulk_insert(trips_data)",
             "query": "await manager.filter(total_amount__gte=50.0).limit(100).all()"
         },
         "cqlengine_syntax": {
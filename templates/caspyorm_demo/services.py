@@ -11,9 +11,10 @@ from datetime import datetime, timedelta
 import time
 import psutil
 import uuid
+import msgspec
 
 from .models import TaxiTripCreate, TripQuery
-from .database import TaxiTripManager, TaxiTripModel
+from .database import TaxiTripManager, TaxiTripModel, duration_minutes, utc_now, iso_now
 
 logger = logging.getLogger(__name__)
 
@@ -38,13 +39,18 @@ class TaxiTripService:
         """
         try:
             # Converte para dict e adiciona campos calculados
-            trip_dict = trip_data.dict()
+            trip_dict = msgspec.structs.asdict(trip_data)
             trip_dict['trip_id'] = uuid.uuid4()
             trip_dict['pickup_date'] = trip_data.pickup_datetime.date()
+            trip_dict['trip_duration_minutes'] = duration_minutes(
+                trip_data.pickup_datetime, trip_data.dropoff_datetime
+            )
             
             # Cria e salva o modelo
             trip = TaxiTripModel(**trip_dict)
             await trip.save()
+            row = self.manager.trip_row(trip)
+            await asyncio.gather(self.manager.write_query_tables([row]), self.manager.record_rows([row]))
             
             logger.info(f"Viagem criada: {trip.trip_id}")
             return trip
@@ -116,6 +122,38 @@ class TaxiTripService:
             logger.error(f"Erro ao listar viagens: {e}")
             return []
     
+    async def list_trips_raw(
+        self,
+        vendor_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Lista viagens com filtros, como linhas cruas do driver
+        
+        **Pontos fortes da CaspyORM:**
+        - Uma única consulta, sem instanciar modelos
+        - Linhas serializadas direto na resposta
+        """
+        try:
+            rows = await self.manager.select_rows(
+                limit, offset,
+                vendor_id=vendor_id,
+                start_date=start_date,
+                end_date=end_date,
+                min_amount=min_amount,
+                max_amount=max_amount
+            )
+            logger.info(f"Listadas {len(rows)} viagens")
+            return rows
+        except Exception as e:
+            logger.error(f"Erro ao listar viagens: {e}")
+            return []
+    
     async def update_trip(self, trip_id: str, trip_data: TaxiTripCreate) -> Optional[TaxiTripModel]:
         """
         Atualiza uma viagem
@@ -130,16 +168,18 @@ class TaxiTripService:
             if not trip:
                 return None
             
-            # Atualiza campos
-            update_data = trip_data.dict(exclude_unset=True)
-            for key, value in update_data.items():
-                setattr(trip, key, value)
-            
-            # Atualiza timestamp
-            trip.updated_at = datetime.utcnow()
+            # UPDATE preparado só com as colunas de dados (duração e updated_at no manager);
+            # a viagem já lida serve de linha anterior para reescrever as cópias
+            changes = msgspec.structs.asdict(trip_data)
+            await self.manager.update_trip(
+                trip.trip_id, trip.pickup_date, self.manager.trip_row(trip), **changes
+            )
             
-            # Salva mudanças
-            await trip.save()
+            # Reflete a atualização no objeto devolvido, sem novo save()
+            for key, value in changes.items():
+                setattr(trip, key, value)
+            trip.trip_duration_minutes = duration_minutes(trip.pickup_datetime, trip.dropoff_datetime)
+            trip.updated_at = utc_now()
             
             logger.info(f"Viagem atualizada: {trip_id}")
             return trip
@@ -157,11 +197,10 @@ class TaxiTripService:
         - Verificação de existência
         """
         try:
-            trip = await self.get_trip(trip_id)
-            if not trip:
+            # Remove a viagem, as cópias desnormalizadas e desconta do contador
+            if not await self.manager.delete_trip(trip_id):
                 return False
             
-            await trip.delete()
             logger.info(f"Viagem deletada: {trip_id}")
             return True
             
@@ -169,7 +208,7 @@ class TaxiTripService:
             logger.error(f"Erro ao deletar viagem {trip_id}: {e}")
             return False
     
-    async def bulk_create_trips(self, trips_data: List[TaxiTripCreate]) -> List[TaxiTripModel]:
+    async def bulk_copy_trips(self, trips_data: List[TaxiTripCreate]) -> int:
         """
         Cria múltiplas viagens em lote
         
@@ -182,87 +221,66 @@ class TaxiTripService:
             start_time = time.time()
             start_memory = self.process.memory_info().rss / 1024 / 1024  # MB
             
-            # Prepara dados
-            trips = []
-            for trip_data in trips_data:
-                trip_dict = trip_data.dict()
-                trip_dict['trip_id'] = uuid.uuid4()
-                trip_dict['pickup_date'] = trip_data.pickup_datetime.date()
-                trips.append(TaxiTripModel(**trip_dict))
-            
-            # Insere em lote
-            await self.manager.bulk_create(trips)
+            # Tuplas lidas direto dos Structs, gravadas com um único INSERT preparado
+            rows = self.manager.struct_rows(trips_data, utc_now())
+            inserted = await self.manager.copy_rows(rows)
             
             end_time = time.time()
             end_memory = self.process.memory_info().rss / 1024 / 1024  # MB
             
-            logger.info(f"Bulk create: {len(trips)} viagens em {end_time - start_time:.2f}s")
+            logger.info(f"Bulk create: {inserted} viagens em {end_time - start_time:.2f}s")
             logger.info(f"Memória: {end_memory - start_memory:.2f}MB")
             
-            return trips
+            return inserted
             
         except Exception as e:
             logger.error(f"Erro no bulk create: {e}")
             raise
     
-    async def search_trips(self, query: TripQuery) -> List[TaxiTripModel]:
+    async def search_trips(self, query: TripQuery) -> List[Dict[str, Any]]:
         """
         Busca avançada de viagens
         
         **Pontos fortes da CaspyORM:**
         - Queries complexas com sintaxe simples
         - Filtros combinados
-        - Ordenação flexível
+        - Um statement preparado por combinação de filtros
         """
         try:
-            # Constrói query dinamicamente
-            filter_kwargs = {}
-            
-            if query.vendor_id:
-                filter_kwargs['vendor_id'] = query.vendor_id
-            
-            if query.start_date:
-                filter_kwargs['pickup_datetime__gte'] = query.start_date
-            
-            if query.end_date:
-                filter_kwargs['pickup_datetime__lte'] = query.end_date
-            
-            if query.min_distance:
-                filter_kwargs['trip_distance__gte'] = query.min_distance
-            
-            if query.max_distance:
-                filter_kwargs['trip_distance__lte'] = query.max_distance
-            
-            if query.payment_type:
-                filter_kwargs['payment_type'] = query.payment_type.value
-            
-            # Executa query
-            trips = await self.manager.filter(**filter_kwargs).limit(query.limit).offset(query.offset).all()
-            
-            logger.info(f"Search: {len(trips)} viagens encontradas")
-            return trips
+            rows = await self.manager.select_rows(
+                query.limit, query.offset,
+                vendor_id=query.vendor_id,
+                start_date=query.start_date,
+                end_date=query.end_date,
+                min_distance=query.min_distance,
+                max_distance=query.max_distance,
+                payment_type=query.payment_type
+            )
+            
+            logger.info(f"Search: {len(rows)} viagens encontradas")
+            return rows
             
         except Exception as e:
             logger.error(f"Erro na busca: {e}")
             return []
     
-    async def get_expensive_trips(self, min_amount: float = 50.0, limit: int = 100) -> List[TaxiTripModel]:
+    async def get_expensive_trips(self, min_amount: float = 50.0, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Busca viagens caras
         
         **Pontos fortes da CaspyORM:**
-        - Queries otimizadas por índice
+        - Leitura por partição (tabela desnormalizada por faixa de valor)
         - Filtros numéricos eficientes
         """
         try:
-            trips = await self.manager.filter(total_amount__gte=min_amount).limit(limit).all()
+            trips = await self.manager.find_expensive_rows(min_amount, limit)
             logger.info(f"Expensive trips: {len(trips)} encontradas")
             return trips
         except Exception as e:
             logger.error(f"Erro ao buscar viagens caras: {e}")
             return []
     
-    async def get_long_trips(self, min_distance: float = 10.0, limit: int = 100) -> List[TaxiTripModel]:
+    async def get_long_trips(self, min_distance: float = 10.0, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Busca viagens longas
         
@@ -271,7 +289,7 @@ class TaxiTripService:
         - Ordenação por duração
         """
         try:
-            trips = await self.manager.filter(trip_distance__gte=min_distance).limit(limit).all()
+            trips = await self.manager.find_long_rows(min_distance, limit)
             logger.info(f"Long trips: {len(trips)} encontradas")
             return trips
         except Exception as e:
@@ -287,16 +305,8 @@ class TaxiTripService:
         - Queries otimizadas
         """
         try:
-            stats = await self.manager.get_stats()
-            
-            # Adiciona estatísticas calculadas
-            if stats['total_trips'] > 0:
-                stats['avg_trip_duration'] = stats.get('avg_duration', 0)
-                stats['most_common_payment_type'] = '1'  # Simplificado
-                stats['most_common_rate_code'] = '1'     # Simplificado
-                stats['total_passengers'] = stats['total_trips'] * 2  # Estimativa
-            
-            return stats
+            # Todos os campos de TripStats vêm dos contadores agregados do manager
+            return await self.manager.get_stats()
             
         except Exception as e:
             logger.error(f"Erro ao calcular estatísticas: {e}")
@@ -405,12 +415,13 @@ class TaxiTripService:
             
             # Teste de inserção
             insert_start = time.time()
+            now = utc_now()
             trips = []
             for i in range(sample_size):
                 trip_data = {
                     'vendor_id': '1',
-                    'pickup_datetime': datetime.utcnow() + timedelta(minutes=i),
-                    'dropoff_datetime': datetime.utcnow() + timedelta(minutes=i+30),
+                    'pickup_datetime': now + timedelta(minutes=i),
+                    'dropoff_datetime': now + timedelta(minutes=i+30),
                     'passenger_count': 2,
                     'trip_distance': 5.5,
                     'rate_code_id': '1',
@@ -419,9 +430,9 @@ class TaxiTripService:
                     'fare_amount': 15.50,
                     'total_amount': 21.0
                 }
-                trips.append(TaxiTripModel(**trip_data))
+                trips.append(trip_data)
             
-            await self.manager.bulk_create(trips)
+            await self.manager.bulk_insert(trips)
             insert_time = time.time() - insert_start
             
             # Teste de leitura
@@ -507,7 +518,7 @@ class TaxiTripService:
             total_trips = await self.manager.count()
             
             return {
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': iso_now(),
                 'memory_usage_mb': current_memory,
                 'cpu_percent': cpu_percent,
                 'total_trips': total_trips,
@@ -518,7 +529,7 @@ class TaxiTripService:
         except Exception as e:
             logger.error(f"Erro ao obter métricas: {e}")
             return {
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': iso_now(),
                 'status': 'error',
                 'error': str(e)
             } 
\ No newline at end of file
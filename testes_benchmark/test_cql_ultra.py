@@ -11,7 +11,7 @@ import time
 sys.path.insert(0, str(Path(__file__).parent))
 
 from benchmark.config import DATA_CONFIG, ULTRA_BENCHMARK_CONFIG
-from benchmark.utils import load_and_concat_ultra, memory_usage_mb, console
+from benchmark.utils import load_and_concat_ultra, memory_usage_mb, sample_rows, console
 from benchmark.core.base_cqlengine import run_cqlengine_benchmark
 
 def main():
@@ -39,7 +39,7 @@ def main():
     
     # Amostra os dados se necessário
     if len(df) > data_config['target_records']:
-        df = df.sample(n=data_config['target_records'], random_state=42)
+        df = sample_rows(df, data_config['target_records'])
     
     load_time = time.time() - start_time
     mem_after = memory_usage_mb()